@@ -23,347 +23,1276 @@
 # $Id$
 
 """Reports/Text Reports/Family Chronicles"""
+import cProfile
+import csv
+import hashlib
+import heapq
+import io
+import json
 import logging
-from datetime import date, timedelta
+import multiprocessing
+import os
+import pickle
+import pstats
+import queue
+import shelve
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from urllib.request import pathname2url
 from gramps.gen.plug.docgen import BaseDoc, TextDoc
 from gramps.gen.plug.docbackend import DocBackend
 from gramps.gen.plug import docgen
-from gramps.gen.plug.menu import PersonOption
+from gramps.gen.plug.menu import PersonOption, NumberOption
+from gramps.gen.plug.menu import PersonListOption, FilterOption
+from gramps.gen.plug.menu import DestinationOption, BooleanOption
 from gramps.gen.plug.report import Report
 from gramps.gen.plug.report import MenuReportOptions
+from gramps.gen.plug.report import utils
+from gramps.gen.plug.report._options import OptionHandler
+from gramps.gen.config import config
+from gramps.gen.db import DBMODE_R
+from gramps.gen.db.utils import get_dbid_from_path, make_database
 from gramps.gen.display.place import displayer as place_displayer
 from gramps.gen.lib.eventtype import EventType
 from gramps.gen.lib.notetype import NoteType
 from gramps.gen.lib.person import Person
-from gramps.gen.lib.note import Note
 from gramps.gen.lib.date import Date as GrampsDate
+from gramps.gen.lib.gcalendar import gregorian_sdn
+from gramps.gen.user import User
+try:
+    import numpy
+except ImportError:
+    numpy = None
 LOG = logging.getLogger(".Chronicles")
 
 
-BORN_SYMBOL = r"\gtrsymBorn"
-BAPTIZED_SYMBOL = r"\gtrsymBaptized"
-DIED_SYMBOL = r"\gtrsymDied"
-BURIAL_SYMBOL = r"\gtrsymBuried"
-MARRIED_SYMBOL = r"\gtrsymMarried"
-ENGAGED_SYMBOL = r"\gtrsymEngaged"
+# Kinds of symbols the rows hold; the documents turn them into their output
+BORN_SYMBOL = "born"
+BAPTIZED_SYMBOL = "baptized"
+DIED_SYMBOL = "died"
+BURIAL_SYMBOL = "buried"
+MARRIED_SYMBOL = "married"
+ENGAGED_SYMBOL = "engaged"
+# Symbols of the LaTeX output
+LATEX_SYMBOLS = {
+    BORN_SYMBOL: r"\gtrsymBorn",
+    BAPTIZED_SYMBOL: r"\gtrsymBaptized",
+    DIED_SYMBOL: r"\gtrsymDied",
+    BURIAL_SYMBOL: r"\gtrsymBuried",
+    MARRIED_SYMBOL: r"\gtrsymMarried",
+    ENGAGED_SYMBOL: r"\gtrsymEngaged",
+}
+# Symbols of the CSV and JSON output
+PLAIN_SYMBOLS = {
+    BORN_SYMBOL: "*",
+    BAPTIZED_SYMBOL: "~",
+    DIED_SYMBOL: "†",
+    BURIAL_SYMBOL: "[]",
+    MARRIED_SYMBOL: "oo",
+    ENGAGED_SYMBOL: "o",
+}
+PAGE_REFERENCE_PREFIX = r"S. \pageref{"
 
 # BORN_SYMBOL = "b"
 # DIED_SYMBOL = "d"
 # MARRIED_SYMBOL = "m"
 
-class FamilyChronicles(Report):
+DEFAULT_CACHE_SIZE = 50000
+DEFAULT_PLACE_CACHE_SIZE = 5000
+# Date keys are Julian day numbers as used by Gramps date sort values
+GENERATION_OFFSET = 20*365
+UNDATED_KEY = gregorian_sdn(2999, 12, 31)
+# Part of every table fingerprint; increase it whenever the rendered output
+# changes so that cached tables are rendered again
+FRAGMENT_FORMAT_VERSION = 1
+FRAGMENT_CACHE_NAME = "chronicle-fragments"
+# Seconds a cache entry is kept after the last run that used it
+FRAGMENT_CACHE_MAX_AGE = 90*24*3600
+FRAGMENT_CACHE_USES_KEY = "uses"
+# Increase whenever the snapshot tables or the extracted data change
+SNAPSHOT_VERSION = 3
+SNAPSHOT_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE person (
+    handle TEXT PRIMARY KEY, gramps_id TEXT, gender INTEGER,
+    first_name TEXT, surname TEXT, family_handles TEXT,
+    parent_family_handle TEXT, birth TEXT, death TEXT, heimatort TEXT,
+    change INTEGER);
+CREATE INDEX person_gramps_id ON person (gramps_id);
+CREATE TABLE family (
+    handle TEXT PRIMARY KEY, father_handle TEXT, mother_handle TEXT,
+    child_handles TEXT, marriage TEXT, change INTEGER);
+CREATE TABLE note (handle TEXT PRIMARY KEY, notes TEXT, change INTEGER);
+CREATE TABLE chronicle (
+    root_id TEXT, position INTEGER, person_id TEXT, appearance_key INTEGER,
+    PRIMARY KEY (root_id, position));
+"""
+# Keys looked up in one query, below the SQLite limit of host parameters
+SNAPSHOT_QUERY_SIZE = 500
+
+# Memory estimates in bytes the streaming mode derives the length of the
+# sorted runs and the object cache size from
+MEGABYTE = 1 << 20
+SORT_RECORD_SIZE = 200
+CACHED_OBJECT_SIZE = 4096
+# Records per pickled chunk of a sorted run on disk
+SPILL_CHUNK_SIZE = 1024
+# Environment variables switching on the instrumentation without changing
+# the report options; the profile variable names the pstats output file
+TIMING_VARIABLE = "FAMILY_CHRONICLES_TIMING"
+# Values of the timing variable that leave timing off
+FALSE_VALUES = ("", "0", "false", "no", "off")
+PROFILE_VARIABLE = "FAMILY_CHRONICLES_PROFILE"
+# Number of slowest family tables logged with the phase timings, and of
+# persons with the most fetches logged with the fetch counts
+SLOWEST_TABLES = 10
+# Family tables waiting between two stages of the output pipeline
+PIPELINE_DEPTH = 64
+_PIPELINE_END = object()
+
+def _get_earlier_key(key1, key2):
+    """Return the earlier of two date keys, either of which may be None"""
+    if key1 is None:
+        return key2
+    if key2 is not None and key1 > key2:
+        return key2
+    return key1
+
+def _get_date_text(modifier, day, month, year):
+    """Return the display text of a date given by its modifier and parts"""
+    date_text = ""
+    if modifier == GrampsDate.MOD_NONE:
+        if day == 0:
+            if month == 0:
+                if year == 0:
+                    date_text = ""
+                else:
+                    date_text = "{}".format(year)
+            else:
+                date_text = "{}.{}".format(month, year)
+        else:
+            date_text = "{}.{}.{}".format(day, month, year)
+    # if modifier == GrampsDate.MOD_BEFORE:
+    #     date_text = "vor " + date_text
+    # elif modifier == GrampsDate.MOD_AFTER:
+    #     date_text = "nach " + date_text
+    return date_text
+
+def _argsort(keys):
     """
-    Condensed family report suitable for family chronicles.
+    Return the indices that sort an array('q') column of keys; indices of
+    equal keys stay in ascending order.
     """
-    def __init__(self, database, options, user):
-        # Inject simplified LaTeX handler
-        options.set_document(
-            SimpleLaTeXDoc(
-                options.handler.doc.get_style_sheet(),
-                options.handler.doc.paper, [])
-        )
-        Report.__init__(self, database, options, user)
-        menu = options.menu
-        self.person_id = menu.get_option_by_name('pid').get_value()
-        self._person_id_list = []
-        self._person_appearance_list = []
+    if numpy is not None and keys:
+        return numpy.argsort(
+            numpy.frombuffer(keys, dtype=numpy.int64), kind='stable').tolist()
+    return sorted(range(len(keys)), key=keys.__getitem__)
 
-    def begin_report(self):
+def _patch_order(previous, person_ids, keys):
+    """
+    Return the sort order of a chronicle as indices into person_ids by
+    patching the order of the previous run, or None if it cannot be reused.
+
+    Persons whose key did not change keep their previous relative order as
+    long as they were collected in the same relative order. Changed and new
+    persons are sorted on their own and merged in.
+    """
+    (previous_ids, previous_keys, previous_sorted_ids) = previous
+    index_of = dict((person_id, idx) for idx, person_id in enumerate(person_ids))
+    if len(index_of) != len(person_ids):
+        return None
+    previous_key_of = dict(zip(previous_ids, previous_keys))
+    retained = set()
+    changed = []
+    for idx, person_id in enumerate(person_ids):
+        if previous_key_of.get(person_id) == keys[idx]:
+            retained.add(person_id)
+        else:
+            changed.append(idx)
+
+    if [person_id for person_id in previous_ids if person_id in retained] != \
+        [person_id for person_id in person_ids if person_id in retained]:
+        return None
+    retained_order = [index_of[person_id] for person_id in previous_sorted_ids
+                      if person_id in retained]
+    changed.sort(key=lambda idx: keys[idx])
+    return list(heapq.merge(
+        retained_order, changed, key=lambda idx: (keys[idx], idx)))
+
+def _get_chronicle_filename(output, root_id):
+    """Return the file name of a further chronicle of a batch run"""
+    (root, ext) = os.path.splitext(output)
+    return "{}_{}{}".format(root, root_id, ext)
+
+def _run_pipeline(items, render, write, depth=PIPELINE_DEPTH):
+    """
+    Render and write items in three overlapping stages connected by queues
+    of at most depth entries: the items are produced in the calling thread,
+    which keeps the database access in the thread that opened it, one
+    thread renders them and another one writes the results. The first
+    error of a stage is raised once the pipeline has drained.
+    """
+    produced = queue.Queue(depth)
+    rendered = queue.Queue(depth)
+    errors = []
+
+    def run_stage(source, function, target):
+        while True:
+            item = source.get()
+            if item is _PIPELINE_END:
+                break
+            if errors:
+                continue
+            try:
+                result = function(item)
+            except Exception as error:
+                errors.append(error)
+                continue
+            if target is not None:
+                target.put(result)
+        if target is not None:
+            target.put(_PIPELINE_END)
+
+    threads = [
+        threading.Thread(target=run_stage, args=(produced, render, rendered)),
+        threading.Thread(target=run_stage, args=(rendered, write, None))]
+    for thread in threads:
+        thread.start()
+    try:
+        for item in items:
+            if errors:
+                break
+            produced.put(item)
+    finally:
+        produced.put(_PIPELINE_END)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+
+def _get_page_reference(gramps_id):
+    """
+    Return the reference text to the family table of the person with the
+    given gramps id, nothing for no id
+    """
+    if not gramps_id:
+        return ''
+    return PAGE_REFERENCE_PREFIX + gramps_id + "}"
+
+def _get_latex_symbol(symbol):
+    """Return the LaTeX command of a kind of symbol"""
+    return LATEX_SYMBOLS.get(symbol, symbol)
+
+def _get_place_format():
+    """
+    Return the place display format of the Gramps preferences: the place
+    title, or the levels, language, street and order of the selected format
+    of place_formats.xml.
+    """
+    if not config.get('preferences.place-auto'):
+        return ('title',)
+    place_format = place_displayer.get_formats()[
+        config.get('preferences.place-format')]
+    return (place_format.levels, place_format.language, place_format.street,
+            place_format.reverse)
+
+class PhaseTimer:
+    """
+    Wall and CPU time spent in the phases of a report run. Phases may be
+    nested, e.g. database fetches happen within the extraction.
+    """
+    def __init__(self):
+        self._started = {}
+        self._wall = OrderedDict()
+        self._cpu = {}
+        self._calls = {}
+        self._items = {}
+
+    def start(self, phase):
+        self._started[phase] = (time.perf_counter(), time.process_time())
+
+    def stop(self, phase, item=None):
+        """Stop timing a phase; item names what the time was spent on"""
+        (wall, cpu) = self._started.pop(phase)
+        wall = time.perf_counter() - wall
+        self._wall[phase] = self._wall.get(phase, 0.0) + wall
+        self._cpu[phase] = \
+            self._cpu.get(phase, 0.0) + time.process_time() - cpu
+        self._calls[phase] = self._calls.get(phase, 0) + 1
+        if item is not None:
+            self._items.setdefault(phase, []).append(
+                (wall, time.process_time() - cpu, item))
+
+    @contextmanager
+    def phase(self, phase, item=None):
+        self.start(phase)
+        try:
+            yield
+        finally:
+            self.stop(phase, item)
+
+    def log(self, persons):
+        """Log the times of all phases, also per rendered person"""
+        for phase, wall in self._wall.items():
+            LOG.info(
+                "%s: %.3f s wall, %.3f s CPU, %d calls, %.3f ms per person",
+                phase, wall, self._cpu[phase], self._calls[phase],
+                1000.0 * wall / max(1, persons))
+        for phase, items in self._items.items():
+            for (wall, cpu, item) in heapq.nlargest(SLOWEST_TABLES, items):
+                LOG.info("%s of %s: %.3f ms wall, %.3f ms CPU", phase, item,
+                         1000.0 * wall, 1000.0 * cpu)
+
+class ExternalSorter:
+    """
+    Sorts records with bounded memory. Records are collected in runs of at
+    most run_length, every full run is sorted and spilled to a temporary
+    file, and iterating merges the runs lazily.
+    """
+    def __init__(self, run_length, directory=None):
+        self.run_length = run_length
+        self._directory = directory
+        self._run = []
+        self._run_files = []
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def add(self, record):
+        self._run.append(record)
+        self._length += 1
+        if len(self._run) >= self.run_length:
+            self.__spill()
+
+    def __iter__(self):
+        self._run.sort()
+        return heapq.merge(
+            self._run,
+            *[self.__read_run(run_file) for run_file in self._run_files])
+
+    def close(self):
+        """Remove the spilled runs"""
+        for run_file in self._run_files:
+            run_file.close()
+        self._run_files = []
+        self._run = []
+
+    def __spill(self):
+        self._run.sort()
+        run_file = tempfile.TemporaryFile(dir=self._directory)
+        for start in range(0, len(self._run), SPILL_CHUNK_SIZE):
+            pickle.dump(self._run[start:start + SPILL_CHUNK_SIZE], run_file,
+                        pickle.HIGHEST_PROTOCOL)
+        self._run_files.append(run_file)
+        self._run = []
+
+    @staticmethod
+    def __read_run(run_file):
+        run_file.seek(0)
+        while True:
+            try:
+                chunk = pickle.load(run_file)
+            except EOFError:
+                return
+            for record in chunk:
+                yield record
+
+class IdSet:
+    """
+    Set of gramps ids kept in an SQLite file with a bounded page cache, so
+    the ids of large chronicles are not held in memory. Lookups may come
+    from another thread than the one adding the ids.
+    """
+    def __init__(self, filename):
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode = OFF")
+        self._connection.execute("PRAGMA synchronous = OFF")
+        self._connection.execute(
+            "CREATE TABLE ids (gramps_id TEXT PRIMARY KEY) WITHOUT ROWID")
+
+    def __contains__(self, gramps_id):
+        return self._connection.execute(
+            "SELECT 1 FROM ids WHERE gramps_id = ?",
+            (gramps_id,)).fetchone() is not None
+
+    def add(self, gramps_id):
+        self._connection.execute(
+            "INSERT OR IGNORE INTO ids VALUES (?)", (gramps_id,))
+
+    def discard(self, gramps_id):
+        self._connection.execute(
+            "DELETE FROM ids WHERE gramps_id = ?", (gramps_id,))
+
+    def close(self):
+        self._connection.close()
+
+class CountingDatabase:
+    """
+    Database proxy counting the object fetches of a report run per object
+    type, per object and per person they were made for. Objects are counted
+    by handle, whether they were looked up by handle or gramps_id. The
+    report sets the person its fetches are counted for; all other methods
+    are passed through to the wrapped database.
+    """
+    def __init__(self, database):
+        self.database = database
+        # gramps_id of the person fetches are counted for
+        self.person = None
+        self._counts = {}
+        self._objects = {}
+        self._persons = {}
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+    def get_person_from_handle(self, handle):
+        return self.__fetch('get_person_from_handle', handle)
+
+    def get_person_from_gramps_id(self, gramps_id):
+        return self.__fetch('get_person_from_gramps_id', gramps_id)
+
+    def get_family_from_handle(self, handle):
+        return self.__fetch('get_family_from_handle', handle)
+
+    def get_event_from_handle(self, handle):
+        return self.__fetch('get_event_from_handle', handle)
+
+    def get_place_from_handle(self, handle):
+        return self.__fetch('get_place_from_handle', handle)
+
+    def get_note_from_handle(self, handle):
+        return self.__fetch('get_note_from_handle', handle)
+
+    def get_counts(self):
+        """Return a dictionary mapping each object type to its fetches"""
+        return dict(self._counts)
+
+    def get_person_counts(self):
+        """Return a dictionary mapping person ids to the fetches made for
+        them"""
+        return dict(self._persons)
+
+    def get_max_fetches(self, obj_type=None):
         """
-        Collect all persons and order them by earliest event date
+        Return the largest number of fetches of a single object, optionally
+        only of the given object type such as 'person'.
         """
-        self._person_id_list = []
-        self._person_appearance_list = []
-        main_person = self.database.get_person_from_gramps_id(self.person_id)
-        self._collect_persons(main_person)
-        sorted_idx = \
-            [i[0] for i in sorted(enumerate(self._person_appearance_list), \
-                key=lambda x: x[1])]
-        self._person_id_list = [self._person_id_list[i] for i in sorted_idx]
-
-    def _collect_persons(self, person):
-        earliest_date = self._get_earliest_event_date(person)
-        generation_offset = (earliest_date is None)
-        children_count = 0
-        for family_handle in person.get_family_handle_list():
-            family = self.database.get_family_from_handle(family_handle)
-            if family.get_father_handle() == person.handle:
-                earliest_family_date = \
-                    self._get_earliest_event_date(family, generation_offset)
-                if earliest_date:
-                    if earliest_family_date \
-                        and earliest_date > earliest_family_date:
-                        earliest_date = earliest_family_date
+        return max([count for (object_type, _), count
+                    in self._objects.items()
+                    if obj_type is None or object_type == obj_type] or [0])
+
+    def get_repeated_fetches(self):
+        """Return the number of fetches of objects fetched before"""
+        return sum(count - 1 for count in self._objects.values())
+
+    def __fetch(self, method, key):
+        obj_type = method[len("get_"):method.index("_from_")]
+        self._counts[obj_type] = self._counts.get(obj_type, 0) + 1
+        self._persons[self.person] = self._persons.get(self.person, 0) + 1
+        obj = getattr(self.database, method)(key)
+        object_key = (obj_type, obj.handle if obj is not None else key)
+        self._objects[object_key] = self._objects.get(object_key, 0) + 1
+        return obj
+
+class CachedDatabase:
+    """
+    Database wrapper keeping recently fetched objects in a bounded LRU cache.
+    Intended to live for a single report run; all methods not related to
+    object lookup are passed through to the wrapped database.
+    """
+    def __init__(self, database, size=DEFAULT_CACHE_SIZE):
+        self.database = database
+        self.size = size
+        self._cache = OrderedDict()
+        self._hits = {}
+        self._misses = {}
+        # PhaseTimer the database fetches are timed with, if any
+        self.timer = None
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+    def get_person_from_handle(self, handle):
+        return self.__lookup('get_person_from_handle', handle)
+
+    def get_person_from_gramps_id(self, gramps_id):
+        return self.__lookup('get_person_from_gramps_id', gramps_id)
+
+    def get_family_from_handle(self, handle):
+        return self.__lookup('get_family_from_handle', handle)
+
+    def get_event_from_handle(self, handle):
+        return self.__lookup('get_event_from_handle', handle)
+
+    def get_place_from_handle(self, handle):
+        return self.__lookup('get_place_from_handle', handle)
+
+    def get_note_from_handle(self, handle):
+        return self.__lookup('get_note_from_handle', handle)
+
+    def get_statistics(self):
+        """
+        Return a dictionary mapping each lookup method to a (hits, misses)
+        tuple.
+        """
+        return {
+            method: (self._hits.get(method, 0), self._misses.get(method, 0))
+            for method in set(self._hits) | set(self._misses)}
+
+    def clear(self):
+        """Drop all cached objects, keeping the statistics"""
+        self._cache.clear()
+
+    def __lookup(self, method, key):
+        cache_key = (method, key)
+        obj = self._cache.get(cache_key)
+        if obj is not None:
+            self._cache.move_to_end(cache_key)
+            self._hits[method] = self._hits.get(method, 0) + 1
+            return obj
+
+        self._misses[method] = self._misses.get(method, 0) + 1
+        if self.timer is None:
+            obj = getattr(self.database, method)(key)
+        else:
+            with self.timer.phase('db fetch'):
+                obj = getattr(self.database, method)(key)
+        if obj is not None and self.size > 0:
+            self._cache[cache_key] = obj
+            if len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+        return obj
+
+class PlaceTextCache:
+    """
+    Bounded LRU cache of displayed place texts.
+
+    Place names and enclosing places may be restricted to date ranges, so
+    the displayed text of a place depends on the event date. For each place
+    the sort values at which the text may change are collected from its
+    hierarchy; texts are then cached per place and interval between them.
+    The place objects read are kept in a second cache of the same size,
+    which the place displayer reads the enclosing places from.
+    """
+    def __init__(self, database, size=DEFAULT_PLACE_CACHE_SIZE):
+        self.database = database
+        self.size = size
+        self._places = OrderedDict()
+        self._objects = OrderedDict()
+        # PhaseTimer the place display is timed with, if any
+        self.timer = None
+
+    def display(self, place_handle, date_object):
+        """Return the displayed text of a place at the given event date"""
+        if self.timer is None:
+            return self.__display(place_handle, date_object)
+        with self.timer.phase('place display'):
+            return self.__display(place_handle, date_object)
+
+    def __display(self, place_handle, date_object):
+        (bounds, texts, _) = self.__get_entry(place_handle)
+        window = bisect_right(bounds, date_object.get_sort_value())
+        text = texts.get(window)
+        if text is None:
+            place = self.get_place_from_handle(place_handle)
+            text = place_displayer.display(self, place, date_object)
+            texts[window] = text
+        return text
+
+    def get_change_time(self, place_handle):
+        """Return the latest change time of a place and its enclosing places"""
+        return self.__get_entry(place_handle)[2]
+
+    def get_place_from_handle(self, handle):
+        """Return a place object, reading it from the database on first use"""
+        place = self._objects.get(handle)
+        if place is None:
+            place = self.database.get_place_from_handle(handle)
+            if self.size > 0:
+                self._objects[handle] = place
+                if len(self._objects) > self.size:
+                    self._objects.popitem(last=False)
+        else:
+            self._objects.move_to_end(handle)
+        return place
+
+    def __get_entry(self, place_handle):
+        entry = self._places.get(place_handle)
+        if entry is None:
+            (bounds, change) = self.__get_date_bounds(place_handle)
+            entry = (bounds, {}, change)
+            if self.size > 0:
+                self._places[place_handle] = entry
+                if len(self._places) > self.size:
+                    self._places.popitem(last=False)
+        else:
+            self._places.move_to_end(place_handle)
+        return entry
+
+    def __get_date_bounds(self, place_handle):
+        """
+        Return the sorted sort values at which the text of a place may
+        change, and the latest change time of the places in its hierarchy.
+        """
+        bounds = set()
+        change = 0
+        visited = set()
+        pending = [place_handle]
+        while pending:
+            handle = pending.pop()
+            if handle in visited:
+                continue
+            visited.add(handle)
+            place = self.get_place_from_handle(handle)
+            if place is None:
+                continue
+            change = max(change, place.get_change_time())
+            dates = [name.get_date_object() for name in place.get_all_names()]
+            for placeref in place.get_placeref_list():
+                dates.append(placeref.get_date_object())
+                pending.append(placeref.ref)
+            for date_object in dates:
+                if date_object.is_empty():
+                    continue
+                if date_object.is_compound():
+                    (start, stop) = date_object.get_start_stop_range()
+                    values = (GrampsDate(*start).get_sort_value(),
+                              GrampsDate(*stop).get_sort_value())
                 else:
-                    earliest_date = earliest_family_date
+                    values = (date_object.get_sort_value(),)
+                for value in values:
+                    bounds.add(value)
+                    bounds.add(value + 1)
+        return (sorted(bounds), change)
 
-                children_count += len(family.get_child_ref_list())
-                for child_ref in family.get_child_ref_list():
-                    child = self.database.get_person_from_handle(child_ref.ref)
-                    earliest_child_date = \
-                        self._get_earliest_event_date(child, generation_offset)
-                    if earliest_date:
-                        if earliest_child_date \
-                            and earliest_date > earliest_child_date:
-                            earliest_date = earliest_child_date
-                    else:
-                        earliest_date = earliest_child_date
-                    self._collect_persons(child)
-
-        if not earliest_date:
-            earliest_date = date(2999, 12, 31)
-        if children_count > 0:
-            self._person_id_list.append(person.gramps_id)
-            self._person_appearance_list.append(earliest_date)
-
-    def _get_earliest_event_date(self, person, generation_offset=False):
-        earliest_date = None
-        for event_ref in person.get_event_ref_list():
-            event = self.database.get_event_from_handle(event_ref.ref)
+class EventDateTable:
+    """
+    Columnar table of the event dates of one chronicle.
+
+    Events are registered while the tree is walked and extracted. compute()
+    then derives the date key of the earliest event of every registered
+    person and family and the display text of every event in one pass,
+    vectorized with NumPy when it is installed.
+    """
+    def __init__(self, database):
+        self.database = database
+        self._rows = {}
+        self._owners = {}
+        self._modifiers = array('l')
+        self._days = array('l')
+        self._months = array('l')
+        self._years = array('l')
+        self._sort_values = array('l')
+        self._owner_numbers = array('l')
+        self._owner_rows = array('l')
+        self._keys = {}
+        self._texts = []
+
+    def add_events(self, obj, events=None):
+        """
+        Register all events of a person or family. events are the already
+        fetched events of obj in the order of its event references.
+        """
+        if obj.handle in self._owners:
+            return
+        owner = self._owners.setdefault(obj.handle, len(self._owners))
+        event_refs = obj.get_event_ref_list()
+        if events is None:
+            events = [None] * len(event_refs)
+        for event_ref, event in zip(event_refs, events):
+            self._owner_numbers.append(owner)
+            self._owner_rows.append(self.add_event(event_ref.ref, event))
+
+    def add_event(self, event_handle, event=None):
+        """Register a single event and return its row"""
+        row = self._rows.get(event_handle)
+        if row is None:
+            if event is None:
+                event = self.database.get_event_from_handle(event_handle)
             date_object = event.get_date_object()
-            if date_object:
-                date_components = date_object.get_dmy()
-                if date_components[2] > 0:
-                    date_components = (
-                        max(date_components[0], 1),
-                        max(date_components[1], 1),
-                        date_components[2])
-                    event_date = date(
-                        year=date_components[2],
-                        month=date_components[1],
-                        day=date_components[0])
-                    if not earliest_date or earliest_date > event_date:
-                        earliest_date = event_date
-        if earliest_date and generation_offset:
-            earliest_date -= timedelta(days=20*365)
-        return earliest_date
+            row = len(self._rows)
+            self._rows[event_handle] = row
+            self._modifiers.append(date_object.get_modifier())
+            self._days.append(date_object.get_day())
+            self._months.append(date_object.get_month())
+            self._years.append(date_object.get_year())
+            self._sort_values.append(date_object.get_sort_value())
+        return row
+
+    def compute(self):
+        """Compute the date keys and texts of all registered events"""
+        if numpy is None:
+            self.__compute_python()
+        else:
+            self.__compute_numpy()
 
-    def write_report(self):
-        for person_id in self._person_id_list:
-            person = self.database.get_person_from_gramps_id(person_id)
-            self.__write_person(person)
+    def get_key(self, handle, generation_offset=False):
+        """
+        Return the date key of the earliest event of a person or family, or
+        None if no event has a year. With generation_offset the key is moved
+        back by one generation.
+        """
+        key = self._keys.get(handle)
+        if key is not None and generation_offset:
+            key -= GENERATION_OFFSET
+        return key
+
+    def get_text(self, event_handle):
+        """Return the display text of the date of an event"""
+        return self._texts[self._rows[event_handle]]
+
+    def __compute_python(self):
+        keys = [None] * len(self._owners)
+        for owner, row in zip(self._owner_numbers, self._owner_rows):
+            if self._years[row] > 0:
+                keys[owner] = _get_earlier_key(
+                    keys[owner], self._sort_values[row])
+        self._keys = {
+            handle: keys[owner] for handle, owner in self._owners.items()}
+
+        texts = {}
+        self._texts = []
+        for values in zip(self._modifiers, self._days, self._months,
+                          self._years):
+            text = texts.get(values)
+            if text is None:
+                text = texts[values] = _get_date_text(*values)
+            self._texts.append(text)
+
+    def __compute_numpy(self):
+        owners = numpy.array(self._owner_numbers, dtype=numpy.int64)
+        rows = numpy.array(self._owner_rows, dtype=numpy.int64)
+        years = numpy.array(self._years, dtype=numpy.int64)
+        sort_values = numpy.array(self._sort_values, dtype=numpy.int64)
+
+        undated = numpy.iinfo(numpy.int64).max
+        keys = numpy.full(len(self._owners), undated, dtype=numpy.int64)
+        dated = years[rows] > 0
+        numpy.minimum.at(keys, owners[dated], sort_values[rows[dated]])
+        keys = keys.tolist()
+        self._keys = {
+            handle: (None if keys[owner] == undated else keys[owner])
+            for handle, owner in self._owners.items()}
+
+        if not self._rows:
+            self._texts = []
+            return
+        # Blank out the date parts a text does not show, so that all events
+        # with the same text share one row of the unique table
+        modifiers = numpy.array(self._modifiers, dtype=numpy.int64)
+        days = numpy.array(self._days, dtype=numpy.int64)
+        months = numpy.array(self._months, dtype=numpy.int64)
+        regular = modifiers == GrampsDate.MOD_NONE
+        with_day = regular & (days != 0)
+        with_month = with_day | (regular & (months != 0))
+        with_year = with_month | (regular & (years != 0))
+        values = numpy.stack((
+            numpy.where(regular, GrampsDate.MOD_NONE, -1),
+            numpy.where(with_day, days, 0),
+            numpy.where(with_month, months, 0),
+            numpy.where(with_year, years, 0)), axis=1)
+        unique_values, inverse = numpy.unique(
+            values, axis=0, return_inverse=True)
+        unique_texts = [
+            _get_date_text(*row) for row in unique_values.tolist()]
+        self._texts = [unique_texts[idx] for idx in inverse.reshape(-1).tolist()]
+
+class PersonNoteIndex:
+    """
+    Index of the notes shown next to a parent: its person notes or, if it
+    has none, the descriptions of its vocation events. Notes are only
+    fetched once a person is actually rendered as a parent.
+    """
+    def __init__(self, database):
+        self.database = database
+        self._note_handles = {}
+        self._vocations = {}
+        self._notes = {}
+        self._changes = {}
+
+    def add_person(self, person, vocations):
+        """Register the note handles and vocations of a person"""
+        note_handles = person.get_note_list()
+        if note_handles:
+            self._note_handles[person.handle] = note_handles
+        if vocations:
+            self._vocations[person.handle] = vocations
+
+    def get_notes(self, handle):
+        """Return the note texts of the person with the given handle"""
+        note_list = self._notes.get(handle)
+        if note_list is None:
+            note_list = []
+            change = 0
+            for note_handle in self._note_handles.get(handle, []):
+                note = self.database.get_note_from_handle(note_handle)
+                change = max(change, note.get_change_time())
+                if note.get_type() == NoteType.PERSON:
+                    note_list.append(note.get())
+            if not note_list and handle in self._vocations:
+                note_list.append(", ".join(self._vocations[handle]))
+            self._notes[handle] = note_list
+            self._changes[handle] = change
+        return note_list
+
+    def get_change_time(self, handle):
+        """Return the latest change time of the notes read for a person"""
+        self.get_notes(handle)
+        return self._changes[handle]
+
+    def get_loaded_notes(self):
+        """Return (handle, note texts, change time) of all loaded notes"""
+        return [(handle, note_list, self._changes[handle])
+                for handle, note_list in self._notes.items()]
+
+    def add_loaded_notes(self, handle, note_list, change):
+        """Add notes loaded elsewhere, see get_loaded_notes"""
+        self._notes[handle] = note_list
+        self._changes[handle] = change
+
+    def __getstate__(self):
+        """Only the loaded notes are passed on to worker processes"""
+        state = self.__dict__.copy()
+        state['database'] = None
+        state['_note_handles'] = {}
+        state['_vocations'] = {}
+        return state
+
+class LineageIndex:
+    """
+    Top family of every person of the database: the uppermost main parents
+    family reached by following the fathers, or the mothers where there is
+    no father. Persons with the same top family form a lineage, headed by
+    the father (or mother) of that family. The index is built in one pass;
+    the top families found on the way up are shared by path compression.
+    """
+    def __init__(self, database):
+        self.database = database
+        self._families = {}
+        # families without father, headed by the mother
+        self._mother_headed = set()
+        for family in database.iter_families():
+            self._families[family.handle] = (
+                family.gramps_id,
+                family.get_father_handle() or family.get_mother_handle())
+            if not family.get_father_handle():
+                self._mother_headed.add(family.handle)
+        self._parent_families = {}
+        for person in database.iter_people():
+            family_handle = person.get_main_parents_family_handle()
+            self._parent_families[person.handle] = \
+                family_handle if family_handle in self._families else None
+        self._top = {}
+        for handle in self._parent_families:
+            self.__resolve(handle)
+        self._lineages = {}
+        for handle, top in self._top.items():
+            if top is not None:
+                self._lineages.setdefault(top, []).append(handle)
+
+    def __resolve(self, handle):
+        """
+        Set the top family of a person and of all its ancestors along the
+        main parents chain that are not resolved yet.
+        """
+        path = []
+        on_path = set()
+        top = None
+        while handle is not None and handle not in self._top:
+            family_handle = self._parent_families.get(handle)
+            if family_handle is None:
+                if handle in self._parent_families:
+                    self._top[handle] = None
+                break
+            if handle in on_path:
+                LOG.warning("Ancestor cycle at family %s",
+                            self._families[family_handle][0])
+                break
+            path.append((handle, family_handle))
+            on_path.add(handle)
+            handle = self._families[family_handle][1]
+        else:
+            if handle is not None:
+                top = self._top[handle]
+        for person_handle, family_handle in reversed(path):
+            if top is None:
+                top = family_handle
+            self._top[person_handle] = top
+
+    def get_top_family(self, handle):
+        """
+        Return the gramps id of the top family of a person, None if the
+        person has no main parents family.
+        """
+        top = self._top.get(handle)
+        return self._families[top][0] if top is not None else None
 
-    def __write_person(self, person):
-        self.doc.start_table('myTable', 'Family-Table')
+    def get_members(self, family_id):
+        """Return the handles of the persons of a lineage"""
+        family_handle = self.__get_family_handle(family_id)
+        return list(self._lineages.get(family_handle, []))
 
-        for fam_idx, family_handle in \
-            enumerate(person.get_family_handle_list()):
-            family = self.database.get_family_from_handle(family_handle)
+    def get_head(self, family_id):
+        """Return the handle of the person heading a lineage"""
+        family_handle = self.__get_family_handle(family_id)
+        return self._families[family_handle][1] if family_handle else None
 
-            mother_handle = family.get_mother_handle()
-            mother = self.database.get_person_from_handle(mother_handle)
-            marriage_ref = self.__get_marriage_event_ref(family)
+    def get_sizes(self):
+        """Return the number of persons per lineage, by top family id"""
+        return {self._families[top][0]: len(members)
+                for top, members in self._lineages.items()}
 
+    def get_heads(self, min_size=1, maternal_lines=False):
+        """
+        Return the handles of the heads of all lineages with at least
+        min_size persons, largest lineage first. The chronicle of a mother
+        only shows her children with maternal lines, so lineages headed by
+        a mother are left out otherwise.
+        """
+        lineages = sorted(
+            (-len(members), self._families[top][0], self._families[top][1])
+            for top, members in self._lineages.items()
+            if len(members) >= min_size and self._families[top][1] and
+            (maternal_lines or top not in self._mother_headed))
+        return [head for _, _, head in lineages]
+
+    def __get_family_handle(self, family_id):
+        family = self.database.get_family_from_gramps_id(family_id)
+        return family.handle if family else None
+
+class PersonRecord:
+    """
+    Person data shown in the family tables.
+    """
+    __slots__ = ('handle', 'gramps_id', 'gender', 'name', 'family_handles',
+                 'parent_family_handle', 'birth', 'death', 'heimatort',
+                 'change')
+
+    def __init__(self, person):
+        self.handle = person.handle
+        self.gramps_id = person.gramps_id
+        self.gender = person.get_gender()
+        name = person.get_primary_name()
+        self.name = (name.first_name, name.get_surname())
+        self.family_handles = person.get_family_handle_list()
+        parent_family_handles = person.get_parent_family_handle_list()
+        self.parent_family_handle = \
+            parent_family_handles[0] if parent_family_handles else None
+        # (symbol, date text, place text); until the model is resolved the
+        # date text is the handle of the event
+        self.birth = ('', '', '')
+        self.death = ('', '', '')
+        self.heimatort = ''
+        # latest change time of the person and the events and places read
+        self.change = person.get_change_time()
+
+    def get_row(self):
+        """Return the record as row of the snapshot person table"""
+        return (self.handle, self.gramps_id, self.gender, self.name[0],
+                self.name[1], json.dumps(self.family_handles),
+                self.parent_family_handle, json.dumps(self.birth),
+                json.dumps(self.death), self.heimatort, self.change)
+
+    @classmethod
+    def from_row(cls, row):
+        """Return the record stored in a row of the snapshot person table"""
+        record = cls.__new__(cls)
+        (record.handle, record.gramps_id, record.gender, first_name, surname,
+         family_handles, record.parent_family_handle, birth, death,
+         record.heimatort, record.change) = row
+        record.name = (first_name, surname)
+        record.family_handles = json.loads(family_handles)
+        record.birth = tuple(json.loads(birth))
+        record.death = tuple(json.loads(death))
+        return record
+
+class FamilyRecord:
+    """
+    Family data shown in the family tables.
+    """
+    __slots__ = ('handle', 'father_handle', 'mother_handle', 'child_handles',
+                 'marriage', 'change')
+
+    def __init__(self, family):
+        self.handle = family.handle
+        self.father_handle = family.get_father_handle()
+        self.mother_handle = family.get_mother_handle()
+        self.child_handles = [
+            child_ref.ref for child_ref in family.get_child_ref_list()]
+        # (symbol, date text, place text) or None, see PersonRecord.birth
+        self.marriage = None
+        # see PersonRecord.change
+        self.change = family.get_change_time()
+
+    def get_row(self):
+        """Return the record as row of the snapshot family table"""
+        return (self.handle, self.father_handle, self.mother_handle,
+                json.dumps(self.child_handles), json.dumps(self.marriage),
+                self.change)
+
+    @classmethod
+    def from_row(cls, row):
+        """Return the record stored in a row of the snapshot family table"""
+        record = cls.__new__(cls)
+        (record.handle, record.father_handle, record.mother_handle,
+         child_handles, marriage, record.change) = row
+        record.child_handles = json.loads(child_handles)
+        marriage = json.loads(marriage)
+        record.marriage = tuple(marriage) if marriage else None
+        return record
+
+    def get_spouse_handle(self, handle):
+        """Return the handle of the other parent than the given one"""
+        if self.father_handle == handle:
+            return self.mother_handle
+        return self.father_handle
+
+class ChronicleModel:
+    """
+    In-memory extract of all persons and families of one chronicle.
+    """
+    def __init__(self):
+        self.persons = {}
+        self.families = {}
+        self.handles = {}
+
+    def add_person(self, record):
+        self.persons[record.handle] = record
+        self.handles[record.gramps_id] = record.handle
+
+    def add_family(self, record):
+        self.families[record.handle] = record
+
+    def get_person(self, handle):
+        return self.persons[handle]
+
+    def get_person_from_gramps_id(self, gramps_id):
+        return self.persons[self.handles[gramps_id]]
+
+    def get_family(self, handle):
+        return self.families[handle]
+
+    def resolve_dates(self, get_text):
+        """
+        Replace the event handles in the date fields of all records by the
+        date texts returned from get_text.
+        """
+        def resolve(data):
+            if data is None or not data[1]:
+                return data
+            return (data[0], get_text(data[1]), data[2])
+
+        for record in self.persons.values():
+            record.birth = resolve(record.birth)
+            record.death = resolve(record.death)
+        for record in self.families.values():
+            record.marriage = resolve(record.marriage)
+
+class ChronicleRenderer:
+    """
+    Writes the family tables of a chronicle from its model. Only the model,
+    the note index and the chronicle positions are needed, so tables can
+    also be rendered in worker processes.
+    """
+    def __init__(self, doc, model, notes, person_positions):
+        self.doc = doc
+        self._model = model
+        self._notes = notes
+        self._person_positions = person_positions
+        self._place_format = None
+
+    def get_families(self, person):
+        """
+        Return the families shown in the family table of a person: those it
+        is the father of, and those it is the mother of if the father has
+        no table of his own in the chronicle. So a family of two
+        descendants is only shown once, in the table of the father.
+        """
+        families = []
+        for family_handle in person.family_handles:
+            family = self._model.get_family(family_handle)
+            if family.father_handle == person.handle or \
+                not family.father_handle or \
+                self._model.get_person(family.father_handle).gramps_id \
+                not in self._person_positions:
+                families.append(family)
+        return families
+
+    def get_parent_handles(self, person):
+        """
+        Return the handles of all persons written as parents in the family
+        table of a person: the person itself and its spouses.
+        """
+        parent_handles = [person.handle]
+        for family in self.get_families(person):
+            spouse_handle = family.get_spouse_handle(person.handle)
+            if spouse_handle:
+                parent_handles.append(spouse_handle)
+        return parent_handles
+
+    def get_fingerprint(self, person):
+        """
+        Return a fingerprint of everything the family table of a person is
+        rendered from: the change times of all records and notes read, the
+        page references to other tables and the place display format.
+        """
+        if self._place_format is None:
+            self._place_format = _get_place_format()
+        persons = [person]
+        families = []
+        for family in self.get_families(person):
+            families.append(family)
+            for child_handle in family.child_handles:
+                child = self._model.get_person(child_handle)
+                persons.append(child)
+                for child_family_handle in child.family_handles:
+                    child_family = self._model.get_family(child_family_handle)
+                    families.append(child_family)
+                    for handle in (child_family.father_handle,
+                                   child_family.mother_handle):
+                        if handle and handle != child.handle:
+                            persons.append(self._model.get_person(handle))
+
+        parts = [FRAGMENT_FORMAT_VERSION, self._place_format]
+        for handle in self.get_parent_handles(person):
+            parent = self._model.get_person(handle)
+            persons.append(parent)
+            parts.append(self._notes.get_change_time(handle))
+        if families and person.parent_family_handle:
+            family = self._model.get_family(person.parent_family_handle)
+            families.append(family)
+            for handle in (family.father_handle, family.mother_handle):
+                if handle:
+                    persons.append(self._model.get_person(handle))
+        # whether the families are shown depends on the tables of the
+        # spouses
+        for family_handle in person.family_handles:
+            spouse_handle = self._model.get_family(
+                family_handle).get_spouse_handle(person.handle)
+            if spouse_handle:
+                persons.append(self._model.get_person(spouse_handle))
+
+        for record in persons:
+            parts.append((record.gramps_id, record.change,
+                          record.gramps_id in self._person_positions))
+        for record in families:
+            parts.append(record.change)
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+    def write_person(self, person):
+        """Write the family table of a person"""
+        self.doc.start_table('myTable', 'Family-Table')
+
+        families = self.get_families(person)
+        for fam_idx, family in enumerate(families):
             if fam_idx == 0:
-                father_handle = family.get_father_handle()
-                father = self.database.get_person_from_handle(father_handle)
-                self.__write_parent(father)
-                self.__write_parent_family(father)
-                # self._write_background_info(father)
+                self.__write_parent(person)
+                self.__write_parent_family(person)
+                # self._write_background_info(person)
             else:
-                self.doc.start_row()
-                self.doc.start_cell('Family-Cell')
-                self.doc.write_text("{}. Ehe".format(fam_idx+1))
-                self.doc.end_cell()
-                self.doc.start_cell('Family-Cell', 14)
-                self.doc.end_cell()
-                self.doc.end_row()
-
-            self.__write_parent(mother, marriage_ref)
+                self.doc.write_row(MARRIAGE_SEPARATOR_ROW, (fam_idx+1,))
+
+            spouse_handle = family.get_spouse_handle(person.handle)
+            if spouse_handle:
+                spouse = self._model.get_person(spouse_handle)
+                self.__write_parent(spouse, family.marriage)
             # self.__write_parent2(mother, marriage_ref, mother_heimatort)
             #self.__write_parent_of(mother)
             self.doc.write_text(r"\\"+"\n")
 
-            do_person_report = len(family.get_child_ref_list()) * [False]
-            for idx, child_ref in enumerate(family.get_child_ref_list()):
-                child = self.database.get_person_from_handle(child_ref.ref)
+            do_person_report = len(family.child_handles) * [False]
+            for idx, child_handle in enumerate(family.child_handles):
+                child = self._model.get_person(child_handle)
                 do_person_report[idx] = self.__write_child(child)
 
-            if fam_idx < len(person.get_family_handle_list()):
+            if fam_idx < len(families):
                 self.doc.write_text(r"\\"+"\n"+r"\\"+"\n"+r"\\"+"\n"+r"\\"+"\n")
 
         self.doc.end_table(person.gramps_id)
 
-    def __write_basic_person(self, person, full_name=True,
-                             is_main_person=False):
-        name = self.__get_simple_name(person)
-
-        birth_data = {'sym':'', 'date':'', 'loc':''}
-        death_data = {'sym':'', 'date':'', 'loc':''}
-        heimatort_data = {'sym':'', 'date':'', 'loc':''}
-
-        for event_ref in person.get_event_ref_list():
-            (event_type, event_date, event_place, _) = \
-                self.__get_simple_event(event_ref)
-            if event_type.is_birth():
-                birth_data['sym'] = BORN_SYMBOL
-                birth_data['date'] = event_date
-                if event_place:
-                    birth_data['loc'] = event_place
-            elif event_type.is_baptism():
-                if not birth_data['sym']:
-                    birth_data['sym'] = BAPTIZED_SYMBOL
-                    birth_data['date'] = event_date
-                if not birth_data['loc'] and event_place:
-                    birth_data['loc'] = event_place
-
-            if event_type.is_death():
-                death_data['sym'] = DIED_SYMBOL
-                death_data['date'] = event_date
-                if event_place:
-                    death_data['loc'] = event_place
-            elif event_type.is_burial():
-                if not death_data['sym']:
-                    death_data['sym'] = BURIAL_SYMBOL
-                    death_data['date'] = event_date
-                if not birth_data['loc'] and event_place:
-                    death_data['loc'] = event_place
-
-            if event_type.is_type('Census'):
-                if event_place:
-                    heimatort_data['loc'] = event_place
-
-        self.doc.start_cell('Family-Cell')
-        if is_main_person:
-            self.doc.start_bold()
+    def __get_person_values(self, person, full_name=True):
+        """Return the values of the 8 person cells of a row"""
+        (birth_sym, birth_date, birth_loc) = person.birth
+        (death_sym, death_date, death_loc) = person.death
         if full_name:
-            name_text = "{} {}".format(name[0], name[1])
+            name_text = "{} {}".format(person.name[0], person.name[1])
         else:
-            name_text = name[0]
-
-        self.doc.write_text(name_text)
-        if is_main_person:
-            self.doc.end_bold()
-        self.doc.end_cell()
-
-        self.doc.start_cell('Family-Cell')
-        self.doc.write_text(birth_data['sym'])
-        self.doc.end_cell()
-
-        self.doc.start_cell('Family-Cell')
-        self.doc.write_text(birth_data['date'])
-        self.doc.end_cell()
-
-        self.doc.start_cell('Family-Cell')
-        self.doc.write_text(birth_data['loc'])
-        self.doc.end_cell()
-
-        self.doc.start_cell('Family-Cell')
-        self.doc.end_cell()
-
-        self.doc.start_cell('Family-Cell')
-        if death_data['date']:
-            self.doc.write_text(death_data['sym'])
-        self.doc.end_cell()
-
-        self.doc.start_cell('Family-Cell')
-        self.doc.write_text(death_data['date'])
-        self.doc.end_cell()
-
-        self.doc.start_cell('Family-Cell')
-        self.doc.write_text(death_data['loc'])
-        self.doc.end_cell()
-
-    def __write_parent(self, person, marriage_ref=None):
-        note_list = []
-        for ref_handle in person.get_referenced_handles():
-            if ref_handle[0] == Note.__name__:
-                note = self.database.get_note_from_handle(ref_handle[1])
-                if note.get_type() == NoteType.PERSON:
-                    note_list.append(note.get())
+            name_text = person.name[0]
+        if not death_date:
+            death_sym = ''
+        return (name_text, birth_sym, birth_date, birth_loc,
+                death_sym, death_date, death_loc)
+
+    def __write_parent(self, person, marriage=None):
+        note_list = self._notes.get_notes(person.handle)
 
-        if not note_list:
-            vocation_list = set()
-            for event_ref in person.get_event_ref_list():
-                event = self.database.get_event_from_handle(event_ref.ref)
-                event_type = event.get_type()
-                if event_type.value in \
-                    (EventType.ELECTED, EventType.OCCUPATION):
-                    vocation_list.add(event.get_description())
-            if vocation_list:
-                note_list.append(", ".join(list(vocation_list)))
-
-        if marriage_ref:
-            heimatort_ref = self.__get_heimatort_event_ref(person)
-            (_, _, parent_heimatort, _) = self.__get_simple_event(heimatort_ref)
+        if marriage:
+            parent_heimatort = person.heimatort
             marriage_line = 1
         else:
             marriage_line = 0
 
         number_of_lines = max(1, marriage_line + len(note_list))
         for line_idx in range(number_of_lines):
-            self.doc.start_row()
-            if line_idx == 0:
-                # 8 cells
-                self.__write_basic_person(
-                    person,
-                    is_main_person=(marriage_ref is None))
+            if note_list and line_idx >= marriage_line:
+                note = note_list[line_idx - marriage_line]
             else:
-                self.doc.start_cell('Family-Cell', 8)
-                self.doc.end_cell()
-            self.doc.start_cell('Family-Cell')
-            self.doc.end_cell()
-            if marriage_ref and line_idx == 0:
-                # 3 cells
-                self.__write_marriage(marriage_ref, True)
-
-                self.doc.start_cell('Family-Cell')
+                note = ''
+            if line_idx > 0:
+                self.doc.write_row(NOTE_ROW, (note,))
+            elif marriage:
+                (symbol, marriage_date, marriage_place) = marriage
                 if parent_heimatort:
-                    self.doc.write_text("v. {}".format(parent_heimatort))
-                self.doc.end_cell()
-
-                self.doc.start_cell('Family-Cell', 2)
-                self.doc.end_cell()
+                    heimatort_text = "v. {}".format(parent_heimatort)
+                else:
+                    heimatort_text = ''
+                self.doc.write_row(
+                    SPOUSE_ROW,
+                    self.__get_person_values(person) + (
+                        symbol, marriage_date, marriage_place,
+                        heimatort_text))
             else:
-                self.doc.start_cell('Family-Cell', 6, 'N')
-                if note_list:
-                    self.doc.write_text(note_list[line_idx - marriage_line])
-                self.doc.end_cell()
-            self.doc.end_row()
+                self.doc.write_row(
+                    MAIN_PARENT_ROW, self.__get_person_values(person) + (note,))
 
     def __write_parent_family(self, person):
-        family_handle = person.get_parent_family_handle_list()
         father = None
         mother = None
 
         parent_names = []
-        if family_handle:
-            family = self.database.get_family_from_handle(family_handle[0])
-            father_handle = family.get_father_handle()
-            mother_handle = family.get_mother_handle()
-            parent_names = []
-            if father_handle:
-                father = self.database.get_person_from_handle(father_handle)
-                name = self.__get_simple_name(father)
-                parent_names.append("{} {}".format(name[0], name[1]))
-            if mother_handle:
-                mother = self.database.get_person_from_handle(mother_handle)
-                name = self.__get_simple_name(mother)
-                parent_names.append("{} {}".format(name[0], name[1]))
-        if person.get_gender() == Person.MALE:
+        if person.parent_family_handle:
+            family = self._model.get_family(person.parent_family_handle)
+            if family.father_handle:
+                father = self._model.get_person(family.father_handle)
+                parent_names.append("{} {}".format(*father.name))
+            if family.mother_handle:
+                mother = self._model.get_person(family.mother_handle)
+                parent_names.append("{} {}".format(*mother.name))
+        if person.gender == Person.MALE:
             text = "Sohn von "
-        elif person.get_gender() == Person.FEMALE:
+        elif person.gender == Person.FEMALE:
             text = "Tochter von "
         else:
             text = "Kind von "
 
         if parent_names:
-            self.doc.start_row()
-            self.doc.start_cell('Family-Cell', 5)
-            self.doc.write_text(text + " und ".join(parent_names))
-            self.doc.end_cell()
-            for _ in range(9):
-                self.doc.start_cell('Family-Cell')
-                self.doc.end_cell()
-            self.doc.start_cell('Family-Cell')
-            if father and father.gramps_id in self._person_id_list:
-                self.doc.write_text("S. ")
-                self.doc.make_pageref(father.gramps_id)
-            elif mother and mother.gramps_id in self._person_id_list:
-                self.doc.write_text("S. ")
-                self.doc.make_pageref(mother.gramps_id)
-            self.doc.end_cell()
-            self.doc.end_row()
+            if father and father.gramps_id in self._person_positions:
+                reference = father.gramps_id
+            elif mother and mother.gramps_id in self._person_positions:
+                reference = mother.gramps_id
+            else:
+                reference = ''
+            self.doc.write_row(
+                PARENTS_ROW, (text + " und ".join(parent_names), reference))
 
 
     # def __write_parent2(self, person, marriage_ref=None, heimatort=None,
@@ -474,125 +1403,1266 @@ class FamilyChronicles(Report):
     #         self.doc.end_row()
 
     def __write_child(self, person):
-        self.doc.start_row()
-        # 8 cells
-        self.__write_basic_person(person, full_name=False)
+        person_values = self.__get_person_values(person, full_name=False)
         followup = True
 
-        family_handle_list = person.get_family_handle_list()
+        family_handle_list = person.family_handles
         if not family_handle_list:
-            self.doc.start_cell('Family-Cell', 7)
-            self.doc.end_cell()
-            self.doc.end_row()
+            self.doc.write_row(CHILD_ROW, person_values)
             followup = False
         else:
+            if person.gramps_id in self._person_positions:
+                reference = person.gramps_id
+            else:
+                reference = ''
             for idx, family_handle in enumerate(family_handle_list):
-                if idx > 0:
-                    self.doc.start_row()
-                    #no basic person
-                    self.doc.start_cell('Family-Cell', 8)
-                    self.doc.end_cell()
-
-                family = self.database.get_family_from_handle(family_handle)
-                father_handle = family.get_father_handle()
-                mother_handle = family.get_mother_handle()
-                if father_handle == person.handle:
-                    spouse_handle = mother_handle
+                family = self._model.get_family(family_handle)
+                spouse_handle = family.get_spouse_handle(person.handle)
+                if family.marriage:
+                    (symbol, marriage_date, _) = family.marriage
                 else:
-                    spouse_handle = father_handle
+                    (symbol, marriage_date) = ('', '')
+
                 if spouse_handle:
-                    spouse = self.database.get_person_from_handle(spouse_handle)
-                    spouse_name = self.__get_simple_name(spouse)
-                    spouse_heimatort_ref = \
-                        self.__get_heimatort_event_ref(spouse)
-                    if spouse_heimatort_ref:
-                        (_, _, spouse_heimatort, _) = \
-                            self.__get_simple_event(spouse_heimatort_ref)
+                    spouse = self._model.get_person(spouse_handle)
+                    if spouse.heimatort:
+                        heimatort_text = "v. {}".format(spouse.heimatort)
                     else:
-                        spouse_heimatort = ''
-                marriage_ref = self.__get_marriage_event_ref(family)
+                        heimatort_text = ''
+                    values = (symbol, marriage_date) + spouse.name + (
+                        heimatort_text, reference)
+                    template = CHILD_MARRIAGE_ROW
+                else:
+                    values = (symbol, marriage_date, reference)
+                    template = CHILD_MARRIAGE_NO_SPOUSE_ROW
 
-                self.doc.start_cell('Family-Cell')
-                self.doc.end_cell()
+                if idx == 0:
+                    self.doc.write_row(
+                        template[0], person_values + values)
+                else:
+                    #no basic person
+                    self.doc.write_row(template[1], values)
+                followup = (family.father_handle == person.handle)
 
-                # 2 cells
-                self.__write_marriage(marriage_ref)
+        return followup
 
-                if spouse_handle:
-                    self.doc.start_cell('Family-Cell')
-                    self.doc.write_text(
-                        "{} {} ".format(spouse_name[0], spouse_name[1]))
-                    self.doc.end_cell()
-
-                    self.doc.start_cell('Family-Cell')
-                    if spouse_heimatort:
-                        self.doc.write_text("v. {}".format(spouse_heimatort))
-                    self.doc.end_cell()
-                else:
-                    self.doc.start_cell('Family-Cell', 2)
-                    self.doc.end_cell()
+class ChronicleSnapshot:
+    """
+    SQLite file holding the extracted model, the notes shown and the order
+    of the chronicles of a run. Later runs on an unchanged database and
+    render_snapshot() use it instead of extracting the chronicles again.
+    """
+    def __init__(self, filename):
+        self.filename = filename
 
+    def load(self, signature=None):
+        """
+        Return the model, the note index and the chronicles stored in the
+        snapshot, or None if there is no snapshot of the current version.
+        With a signature, a snapshot taken with another one is ignored too.
+        """
+        if not os.path.exists(self.filename):
+            return None
+        connection = self.__connect()
+        try:
+            meta = dict(connection.execute("SELECT key, value FROM meta"))
+            if meta.get('version') != str(SNAPSHOT_VERSION) or \
+                (signature is not None and meta.get('signature') != signature):
+                return None
+
+            model = ChronicleModel()
+            for row in connection.execute("SELECT * FROM person"):
+                model.add_person(PersonRecord.from_row(row))
+            for row in connection.execute("SELECT * FROM family"):
+                model.add_family(FamilyRecord.from_row(row))
+            notes = PersonNoteIndex(None)
+            for (handle, note_list, change) in \
+                connection.execute("SELECT * FROM note"):
+                notes.add_loaded_notes(handle, json.loads(note_list), change)
+
+            chronicles = OrderedDict()
+            for (root_id, person_id, appearance_key) in connection.execute(
+                    "SELECT root_id, person_id, appearance_key FROM chronicle "
+                    "ORDER BY rowid"):
+                (person_id_list, appearance_list) = chronicles.setdefault(
+                    root_id, ([], []))
+                person_id_list.append(person_id)
+                appearance_list.append(appearance_key)
+        except sqlite3.DatabaseError as error:
+            LOG.warning("Ignoring snapshot %s: %s", self.filename, error)
+            return None
+        finally:
+            connection.close()
+        return (model, notes, [
+            (root_id,) + orders for root_id, orders in chronicles.items()])
+
+    def load_chronicle(self, root_id):
+        """
+        Return the model, the note index and the person ids of the chronicle
+        of a center person, with only the records its family tables are
+        rendered from: the persons with a table, their families and parent
+        family, the members of these, and the families and spouses of the
+        children.
+        """
+        connection = self.__connect()
+        try:
+            person_id_list = [person_id for (person_id,) in connection.execute(
+                "SELECT person_id FROM chronicle WHERE root_id = ? "
+                "ORDER BY position", (root_id,))]
+            model = ChronicleModel()
+            persons = self.__load_records(
+                connection, model, 'person', 'gramps_id', person_id_list)
+            families = self.__load_records(
+                connection, model, 'family', 'handle',
+                [handle for person in persons
+                 for handle in person.family_handles +
+                 [person.parent_family_handle]])
+            members = self.__load_records(
+                connection, model, 'person', 'handle',
+                [handle for family in families
+                 for handle in [family.father_handle, family.mother_handle] +
+                 family.child_handles])
+            families = self.__load_records(
+                connection, model, 'family', 'handle',
+                [handle for person in members
+                 for handle in person.family_handles])
+            self.__load_records(
+                connection, model, 'person', 'handle',
+                [handle for family in families
+                 for handle in (family.father_handle, family.mother_handle)])
+
+            notes = PersonNoteIndex(None)
+            handles = list(model.persons)
+            for start in range(0, len(handles), SNAPSHOT_QUERY_SIZE):
+                batch = handles[start:start + SNAPSHOT_QUERY_SIZE]
+                for (handle, note_list, change) in connection.execute(
+                        "SELECT * FROM note WHERE handle IN ({})".format(
+                            ", ".join("?" * len(batch))), batch):
+                    notes.add_loaded_notes(
+                        handle, json.loads(note_list), change)
+        finally:
+            connection.close()
+        return (model, notes, person_id_list)
+
+    def __connect(self):
+        return sqlite3.connect(
+            "file:{}?mode=ro".format(
+                pathname2url(os.path.abspath(self.filename))),
+            uri=True)
+
+    @staticmethod
+    def __load_records(connection, model, table, column, keys):
+        """
+        Add the records of the person or family table whose column has one
+        of the given keys to the model, unless already loaded, and return
+        the records added.
+        """
+        if table == 'family':
+            (loaded, record_class, add) = (
+                model.families, FamilyRecord, model.add_family)
+        else:
+            (loaded, record_class, add) = (
+                model.handles if column == 'gramps_id' else model.persons,
+                PersonRecord, model.add_person)
+        keys = [key for key in OrderedDict.fromkeys(keys)
+                if key and key not in loaded]
+        records = []
+        for start in range(0, len(keys), SNAPSHOT_QUERY_SIZE):
+            batch = keys[start:start + SNAPSHOT_QUERY_SIZE]
+            for row in connection.execute(
+                    "SELECT * FROM {} WHERE {} IN ({})".format(
+                        table, column, ", ".join("?" * len(batch))), batch):
+                record = record_class.from_row(row)
+                add(record)
+                records.append(record)
+        return records
+
+    def save(self, signature, model, notes, chronicles):
+        """
+        Write the model, the loaded notes and the chronicles to the
+        snapshot, replacing an existing one.
+        """
+        temp_filename = self.filename + ".tmp"
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        connection = sqlite3.connect(temp_filename)
+        with connection:
+            connection.executescript(SNAPSHOT_SCHEMA)
+            connection.executemany(
+                "INSERT INTO meta VALUES (?, ?)",
+                (('version', str(SNAPSHOT_VERSION)),
+                 ('signature', signature)))
+            connection.executemany(
+                "INSERT INTO person VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (record.get_row() for record in model.persons.values()))
+            connection.executemany(
+                "INSERT INTO family VALUES (?, ?, ?, ?, ?, ?)",
+                (record.get_row() for record in model.families.values()))
+            connection.executemany(
+                "INSERT INTO note VALUES (?, ?, ?)",
+                ((handle, json.dumps(note_list), change)
+                 for (handle, note_list, change) in notes.get_loaded_notes()))
+            for (root_id, person_id_list, appearance_list) in chronicles:
+                connection.executemany(
+                    "INSERT INTO chronicle VALUES (?, ?, ?, ?)",
+                    ((root_id, position, person_id, appearance_key)
+                     for position, (person_id, appearance_key) in enumerate(
+                         zip(person_id_list, appearance_list))))
+        connection.close()
+        os.replace(temp_filename, self.filename)
+
+class FragmentCache:
+    """
+    On-disk cache of rendered family tables keyed by their fingerprint, and
+    of the chronicle orders of the previous run. The time of the last run
+    using an entry is recorded when the cache is closed, and entries not
+    used for max_age seconds are dropped then, so runs for different
+    center persons may share a cache.
+    """
+    def __init__(self, directory, max_age=FRAGMENT_CACHE_MAX_AGE):
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+        self._shelf = shelve.open(
+            os.path.join(directory, FRAGMENT_CACHE_NAME))
+        self._used = set()
+
+    def __contains__(self, fingerprint):
+        if fingerprint in self._shelf:
+            self._used.add(fingerprint)
+            return True
+        return False
+
+    def get(self, fingerprint):
+        """Return the cached table with the given fingerprint"""
+        return self._shelf[fingerprint]
+
+    def put(self, fingerprint, fragment):
+        self._shelf[fingerprint] = fragment
+        self._used.add(fingerprint)
+
+    def get_order(self, root_id):
+        """
+        Return the person ids, appearance keys and sorted person ids of the
+        chronicle of a center person from the previous run, or None.
+        """
+        return self._shelf.get("order:" + root_id)
 
-                self.doc.start_cell('Family-Cell')
-                self.doc.end_cell()
-                self.doc.start_cell('Family-Cell')
-                if person.gramps_id in self._person_id_list:
-                    self.doc.write_text("S. ")
-                    self.doc.make_pageref(person.gramps_id)
-                self.doc.end_cell()
+    def put_order(self, root_id, order):
+        key = "order:" + root_id
+        self._shelf[key] = order
+        self._used.add(key)
 
-                self.doc.end_row()
-                followup = (father_handle == person.handle)
+    def close(self):
+        now = time.time()
+        uses = self._shelf.get(FRAGMENT_CACHE_USES_KEY, {})
+        for key in self._used:
+            uses[key] = now
+        for key in list(self._shelf.keys()):
+            if key == FRAGMENT_CACHE_USES_KEY:
+                continue
+            if now - uses.setdefault(key, now) > self.max_age:
+                del self._shelf[key]
+                del uses[key]
+        self._shelf[FRAGMENT_CACHE_USES_KEY] = uses
+        self._shelf.close()
 
-        return followup
+class FamilyChronicles(Report):
+    """
+    Condensed family report suitable for family chronicles.
+    """
+    def __init__(self, database, options, user):
+        # Inject simplified LaTeX handler
+        options.set_document(
+            SimpleLaTeXDoc(
+                options.handler.doc.get_style_sheet(),
+                options.handler.doc.paper, [])
+        )
+        Report.__init__(self, database, options, user)
+        menu = options.menu
+        self.person_id = menu.get_option_by_name('pid').get_value()
+        if menu.get_option_by_name('count_fetches').get_value():
+            self.fetch_counter = CountingDatabase(database)
+            database = self.fetch_counter
+        else:
+            self.fetch_counter = None
+        cache_size = menu.get_option_by_name('cache_size').get_value()
+        self._memory_limit = \
+            menu.get_option_by_name('memory_limit').get_value() * MEGABYTE
+        if self._memory_limit:
+            cache_size = min(
+                cache_size, self._memory_limit // 4 // CACHED_OBJECT_SIZE)
+        self.database = CachedDatabase(database, cache_size)
+        self._stream_directory = None
+        self._workers = menu.get_option_by_name('workers').get_value()
+        self._pipeline = menu.get_option_by_name('pipeline').get_value()
+        self._row_formats = [
+            (extension, doc_class)
+            for (name, extension, doc_class) in ROW_FORMATS
+            if menu.get_option_by_name(name).get_value()]
+        self._center_person_ids = \
+            menu.get_option_by_name('pids').get_value().split()
+        self._lineage_size = \
+            menu.get_option_by_name('lineage_size').get_value()
+        self._maternal_lines = \
+            menu.get_option_by_name('maternal_lines').get_value()
+        filter_option = menu.get_option_by_name('filter')
+        # the first entry of the filter list only selects the center person
+        self._filter = filter_option.get_filter() \
+            if filter_option.get_value() != 0 else None
+        fragment_cache = \
+            menu.get_option_by_name('fragment_cache').get_value()
+        self._fragments = FragmentCache(fragment_cache) \
+            if fragment_cache else None
+        snapshot = menu.get_option_by_name('snapshot').get_value()
+        self._snapshot = ChronicleSnapshot(snapshot) if snapshot else None
+        self._snapshot_current = False
+        self._chronicles = []
+        # center persons whose chronicles worker processes extract and write
+        self._shard_ids = []
+        self._subtrees = {}
+        self._person_id_list = []
+        self._person_appearance_list = []
+        self._person_positions = {}
+        self._model = ChronicleModel()
+        self._dates = EventDateTable(self.database)
+        self._notes = PersonNoteIndex(self.database)
+        self._place_cache = PlaceTextCache(
+            self.database,
+            menu.get_option_by_name('place_cache_size').get_value())
+
+        self._timer = PhaseTimer()
+        self._timing = menu.get_option_by_name('timing').get_value() or \
+            os.environ.get(TIMING_VARIABLE, "").strip().lower() \
+            not in FALSE_VALUES
+        if self._timing:
+            self.database.timer = self._timer
+            self.doc.timer = self._timer
+        self.doc.tables_per_part = \
+            menu.get_option_by_name('tables_per_part').get_value()
+        self._profile_file = menu.get_option_by_name('profile').get_value() \
+            or os.environ.get(PROFILE_VARIABLE)
+        self._profile = cProfile.Profile() if self._profile_file else None
+
+    def begin_report(self):
+        """
+        Collect all persons of each chronicle and order them by earliest
+        event date
+        """
+        if self._profile is not None:
+            self._profile.enable()
+        self._chronicles = []
+        self._shard_ids = []
+        self._model = ChronicleModel()
+        self._dates = EventDateTable(self.database)
+        self._notes = PersonNoteIndex(self.database)
+        self._place_cache = PlaceTextCache(
+            self.database, self._place_cache.size)
+        if self._timing:
+            self._place_cache.timer = self._timer
+        self._subtrees = {}
+        self._snapshot_current = False
+        center_persons = self.__get_center_persons()
+        if self._memory_limit:
+            with self._timer.phase('traversal'):
+                self.__begin_streaming(center_persons)
+            return
+
+        if self._snapshot is not None:
+            signature = self.__get_snapshot_signature(center_persons)
+            snapshot = self._snapshot.load(signature)
+            if snapshot is not None:
+                LOG.info("Chronicles read from snapshot %s",
+                         self._snapshot.filename)
+                (self._model, self._notes, self._chronicles) = snapshot
+                self._snapshot_current = True
+
+        if not self._chronicles:
+            # a snapshot is taken of all chronicles, else the further ones
+            # are extracted by the worker processes
+            if self._snapshot is None and self._workers > 1 and \
+                len(center_persons) > 1 and \
+                self.options_class.get_output() and \
+                self.__get_serial_reason() is None:
+                self._shard_ids = [
+                    person.gramps_id for person in center_persons[1:]]
+                center_persons = center_persons[:1]
+            with self._timer.phase('traversal'):
+                collected_lists = [
+                    (person.gramps_id, self._collect_persons(person))
+                    for person in center_persons]
+
+            with self._timer.phase('date computation'):
+                self._dates.compute()
+                self._model.resolve_dates(self._dates.get_text)
+            with self._timer.phase('sort'):
+                for (root_id, collected) in collected_lists:
+                    (person_id_list, appearance_list) = \
+                        self.__order_persons(root_id, collected)
+                    self._chronicles.append(
+                        (root_id, person_id_list, appearance_list))
+            if self._snapshot is not None and signature is not None:
+                for (_, person_id_list, _) in self._chronicles:
+                    self.__load_notes(person_id_list)
+                self._snapshot.save(
+                    signature, self._model, self._notes, self._chronicles)
+                self._snapshot_current = True
+
+        (_, self._person_id_list, self._person_appearance_list) = \
+            self._chronicles[0]
+        self.__set_person_positions()
+
+    def __begin_streaming(self, center_persons):
+        """
+        Order the persons of each chronicle with bounded memory: the sort
+        records are passed to an ExternalSorter and the ids of the persons
+        with a family table are kept in an IdSet file. The tables are
+        extracted one at a time by write_report.
+        """
+        self._stream_directory = tempfile.mkdtemp(prefix="chronicles")
+        run_length = max(1, self._memory_limit // 4 // SORT_RECORD_SIZE)
+        for person in center_persons:
+            sorter = ExternalSorter(run_length, self._stream_directory)
+            table_ids = IdSet(os.path.join(
+                self._stream_directory,
+                "tables-" + person.gramps_id + ".sqlite"))
+            self.__stream_persons(person, sorter, table_ids)
+            if self._maternal_lines:
+                self.__drop_streamed_tables(sorter, table_ids)
+            self._chronicles.append((person.gramps_id, sorter, table_ids))
+
+    def __stream_persons(self, main_person, sorter, table_ids):
+        """
+        Walk the descendants of main_person like _collect_persons and add
+        (appearance key, collection number, gramps_id) of every person with
+        children to the sorter. The appearance keys are computed on the way,
+        so only the path to the current person is kept in memory.
+        """
+        sequence = 0
+        stack = [self.__visit_streaming(main_person)]
+        on_stack = {main_person.handle: stack[0]}
+        while stack:
+            frame = stack[-1]
+            child_handle = next(frame[3], None)
+            if child_handle is not None:
+                if child_handle in on_stack:
+                    self.__report_cycle(on_stack[child_handle][0], frame[0])
+                    frame[2] = _get_earlier_key(
+                        frame[2], on_stack[child_handle][1])
+                    continue
+                child = self.database.get_person_from_handle(child_handle)
+                if child.gramps_id in table_ids:
+                    # shared descendant, already walked on another line
+                    frame[2] = _get_earlier_key(
+                        frame[2], self.__get_events_key(child))
+                    continue
+                stack.append(self.__visit_streaming(child))
+                on_stack[child_handle] = stack[-1]
+                continue
+
+            stack.pop()
+            (person, own_key, related_key, _, has_children) = frame
+            del on_stack[person.handle]
+            if stack:
+                stack[-1][2] = _get_earlier_key(stack[-1][2], own_key)
+            if not has_children:
+                continue
+            if own_key is not None:
+                key = _get_earlier_key(own_key, related_key)
+            elif related_key is not None:
+                key = related_key - GENERATION_OFFSET
+            else:
+                key = UNDATED_KEY
+            sorter.add((key, sequence, person.gramps_id))
+            table_ids.add(person.gramps_id)
+            sequence += 1
+
+    def __drop_streamed_tables(self, sorter, table_ids):
+        """
+        Remove the ids of the mothers whose families with children are all
+        shown in the tables of their husbands, see __get_table_handles. The
+        sort records of their tables are skipped when writing.
+        """
+        for (_, _, person_id) in sorter:
+            person = self.database.get_person_from_gramps_id(person_id)
+            for family_handle in person.get_family_handle_list():
+                family = self.database.get_family_from_handle(family_handle)
+                father_handle = family.get_father_handle()
+                if not family.get_child_ref_list():
+                    continue
+                if father_handle == person.handle or not father_handle or \
+                    self.database.get_person_from_handle(
+                        father_handle).gramps_id not in table_ids:
+                    break
+            else:
+                table_ids.discard(person_id)
+
+    def __visit_streaming(self, person):
+        """
+        Return the streaming traversal frame of a person: the person, the
+        key of its own events, the earliest key of the events of its
+        families and children, an iterator over the handles of its children
+        and whether it has children.
+        """
+        if self.fetch_counter is not None:
+            self.fetch_counter.person = person.gramps_id
+        related_key = None
+        child_handles = []
+        for family_handle in person.get_family_handle_list():
+            family = self.database.get_family_from_handle(family_handle)
+            if self.__is_followed(family.get_father_handle(),
+                                  family.get_mother_handle(), person.handle):
+                related_key = _get_earlier_key(
+                    related_key, self.__get_events_key(family))
+                for child_ref in family.get_child_ref_list():
+                    child_handles.append(child_ref.ref)
+        return [person, self.__get_events_key(person), related_key,
+                iter(child_handles), bool(child_handles)]
+
+    def __get_events_key(self, obj):
+        """
+        Return the date key of the earliest event of a person or family, see
+        EventDateTable.get_key
+        """
+        key = None
+        for event_ref in obj.get_event_ref_list():
+            date_object = self.database.get_event_from_handle(
+                event_ref.ref).get_date_object()
+            if date_object.get_year() > 0:
+                key = _get_earlier_key(key, date_object.get_sort_value())
+        return key
+
+    def __get_snapshot_signature(self, center_persons):
+        """
+        Return the signature a snapshot is valid for: the center persons,
+        the lines followed, the place display format and the modification
+        times of the database files. Databases without files, i.e. in
+        memory, have no signature and are not snapshotted.
+        """
+        save_path = self.__get_database_path()
+        if save_path is None:
+            return None
+        files = []
+        for name in sorted(os.listdir(save_path)):
+            filename = os.path.join(save_path, name)
+            if name != "lock" and os.path.isfile(filename):
+                files.append((name, os.path.getmtime(filename),
+                              os.path.getsize(filename)))
+        return json.dumps([os.path.abspath(save_path), files,
+                           [person.gramps_id for person in center_persons],
+                           self._maternal_lines, _get_place_format()])
+
+    def __get_center_persons(self):
+        """
+        Return the persons a chronicle is written for: the center person,
+        the additional center persons, the persons matching the filter and
+        the heads of the lineages of the minimum lineage size.
+        """
+        person_ids = [self.person_id] + self._center_person_ids
+        handles = []
+        if self._filter:
+            handles.extend(self._filter.apply(self.database))
+        if self._lineage_size:
+            handles.extend(LineageIndex(self.database).get_heads(
+                self._lineage_size, self._maternal_lines))
+
+        persons = OrderedDict()
+        for person_id in OrderedDict.fromkeys(person_ids):
+            person = self.database.get_person_from_gramps_id(person_id)
+            if person is None:
+                LOG.warning("Center person %s not found", person_id)
+            else:
+                persons.setdefault(person.handle, person)
+        for handle in handles:
+            if handle not in persons:
+                persons[handle] = self.database.get_person_from_handle(handle)
+        return list(persons.values())
+
+    def __order_persons(self, root_id, collected):
+        """
+        Return the person ids and appearance keys of a chronicle sorted by
+        appearance key. With a fragment cache the order of the previous run
+        is patched instead.
+        """
+        if self._maternal_lines:
+            collected = self.__get_table_handles(collected)
+        person_id_list = []
+        appearance_list = array('q')
+        for person_handle in collected:
+            person_id_list.append(
+                self._model.get_person(person_handle).gramps_id)
+            appearance_list.append(self.__get_appearance_key(person_handle))
+
+        sorted_idx = None
+        if self._fragments is not None:
+            previous = self._fragments.get_order(root_id)
+            if previous is not None:
+                sorted_idx = _patch_order(
+                    previous, person_id_list, appearance_list)
+        if sorted_idx is None:
+            sorted_idx = _argsort(appearance_list)
+        sorted_id_list = [person_id_list[i] for i in sorted_idx]
+        if self._fragments is not None:
+            self._fragments.put_order(
+                root_id, (person_id_list, appearance_list, sorted_id_list))
+        return (sorted_id_list,
+                array('q', [appearance_list[i] for i in sorted_idx]))
+
+    def __get_table_handles(self, collected):
+        """
+        Return the handles of the collected persons that keep a family table
+        when maternal lines are followed. A family whose father has a table
+        is shown in his, see ChronicleRenderer.get_families, so a mother
+        only keeps hers if another of her families has children.
+        """
+        renderer = ChronicleRenderer(None, self._model, self._notes, {
+            self._model.get_person(handle).gramps_id for handle in collected})
+        return [handle for handle in collected if any(
+            family.child_handles for family in
+            renderer.get_families(self._model.get_person(handle)))]
+
+    def __set_person_positions(self):
+        self._person_positions = {
+            person_id: position
+            for position, person_id in enumerate(self._person_id_list)}
+
+    def get_person_position(self, gramps_id):
+        """
+        Return the position of a person in the chronicle, or None if the
+        person has no family table of its own.
+        """
+        return self._person_positions.get(gramps_id)
 
-    def __write_marriage(self, marriage_ref, show_place=False):
-        if marriage_ref:
-            (marriage_type, marriage_date, marriage_place, _) = \
-                self.__get_simple_event(marriage_ref)
-            self.doc.start_cell('Family-Cell')
-            if marriage_type:
+    def _collect_persons(self, main_person):
+        """
+        Walk the descendants of main_person depth-first using an explicit
+        stack, extracting their records and families to the model on the
+        way.
+
+        Return the handles of the persons with children in the order of the
+        former recursive walk, i.e. each after all of their descendants.
+        Their tables are extracted to the model on the way. Descendants
+        reached on several lines are walked and collected once; a person
+        that is its own ancestor is reported and not walked again. Complete
+        subtrees already walked for another center person are reused.
+        """
+        if main_person.handle in self._subtrees:
+            (subtree_list, start, end) = self._subtrees[main_person.handle]
+            return subtree_list[start:end]
+
+        collected = []
+        collected_handles = set()
+        main_person = self._add_person(main_person)
+        stack = [self.__visit_person(main_person, 0)]
+        on_stack = {main_person.handle: main_person}
+        while stack:
+            frame = stack[-1]
+            (person, children, has_children, start, _) = frame
+            child_handle = next(children, None)
+            if child_handle is not None:
+                if child_handle in on_stack:
+                    self.__report_cycle(on_stack[child_handle], person)
+                    frame[4] = True
+                elif child_handle in collected_handles:
+                    # shared descendant, already walked on another line
+                    frame[4] = True
+                elif child_handle in self._subtrees:
+                    (subtree_list, subtree_start, subtree_end) = \
+                        self._subtrees[child_handle]
+                    for handle in subtree_list[subtree_start:subtree_end]:
+                        if handle in collected_handles:
+                            frame[4] = True
+                        else:
+                            collected.append(handle)
+                            collected_handles.add(handle)
+                else:
+                    child = self._add_person(child_handle)
+                    stack.append(self.__visit_person(child, len(collected)))
+                    on_stack[child_handle] = child
+                continue
+
+            stack.pop()
+            del on_stack[person.handle]
+            if has_children:
+                collected.append(person.handle)
+                collected_handles.add(person.handle)
+                if self.fetch_counter is not None:
+                    self.fetch_counter.person = person.gramps_id
+                if self._timing:
+                    with self._timer.phase('extraction'):
+                        self._extract_table(person)
+                else:
+                    self._extract_table(person)
+            if frame[4]:
+                # parts of the subtree belong to other lines, don't reuse it
+                if stack:
+                    stack[-1][4] = True
+            else:
+                self._subtrees[person.handle] = \
+                    (collected, start, len(collected))
+        return collected
+
+    def __visit_person(self, person, start):
+        """
+        Return the traversal frame of the model record of a person: the
+        record, an iterator over the handles of its children, whether it
+        has children, the position in the collected list its subtree starts
+        at and whether parts of the subtree were skipped.
+        """
+        if self.fetch_counter is not None:
+            self.fetch_counter.person = person.gramps_id
+        child_handles = []
+        for family_handle in person.family_handles:
+            family = self._add_family(family_handle)
+            if self.__is_followed(family.father_handle, family.mother_handle,
+                                  person.handle):
+                child_handles.extend(family.child_handles)
+        return [person, iter(child_handles), bool(child_handles), start, False]
+
+    def __is_followed(self, father_handle, mother_handle, handle):
+        """
+        Return whether the children of a family are descendants of the
+        person with the given handle in the chronicle: always for the
+        father, for the mother only if maternal lines are followed.
+        """
+        return father_handle == handle or \
+            (self._maternal_lines and mother_handle == handle)
+
+    def __report_cycle(self, ancestor, person):
+        """Report a person found again among the children of a descendant"""
+        LOG.warning(
+            "Cycle in the family tree: %s is a child of its descendant %s, "
+            "not walking it again", ancestor.gramps_id, person.gramps_id)
+
+    def __get_appearance_key(self, handle):
+        """
+        Return the date key a person is ordered by: the earliest of its own
+        events, the events of the families whose children it is followed to
+        and of their children. Family and children dates count one
+        generation earlier if the person itself has no dated event.
+        """
+        earliest_key = self._dates.get_key(handle)
+        generation_offset = (earliest_key is None)
+        for family_handle in self._model.get_person(handle).family_handles:
+            family = self._model.get_family(family_handle)
+            if not self.__is_followed(
+                    family.father_handle, family.mother_handle, handle):
+                continue
+            for related_handle in [family_handle] + family.child_handles:
+                earliest_key = _get_earlier_key(
+                    earliest_key,
+                    self._dates.get_key(related_handle, generation_offset))
+        if earliest_key is None:
+            earliest_key = UNDATED_KEY
+        return earliest_key
+
+    def _extract_table(self, person):
+        """
+        Add everything the family table of the given person shows to the
+        chronicle model. The person is given as Gramps object or model
+        record.
+        """
+        person = self._add_person(person)
+        self._add_parent_family(person)
+        for family_handle in person.family_handles:
+            family = self._add_family(family_handle)
+            spouse_handle = family.get_spouse_handle(person.handle)
+            if spouse_handle:
+                self._add_person(spouse_handle)
+            for child_handle in family.child_handles:
+                child = self._add_person(child_handle)
+                for child_family_handle in child.family_handles:
+                    child_family = self._add_family(child_family_handle)
+                    spouse_handle = \
+                        child_family.get_spouse_handle(child.handle)
+                    if spouse_handle:
+                        self._add_person(spouse_handle)
+
+    def _add_parent_family(self, person):
+        if person.parent_family_handle:
+            family = self._add_family(person.parent_family_handle)
+            if family.father_handle:
+                self._add_person(family.father_handle)
+            if family.mother_handle:
+                self._add_person(family.mother_handle)
+
+    def _add_person(self, person):
+        """
+        Return the model record of a person given as Gramps object or handle,
+        extracting it from the database on first use.
+        """
+        handle = person if isinstance(person, str) else person.handle
+        record = self._model.persons.get(handle)
+        if record is None:
+            if isinstance(person, str):
+                person = self.database.get_person_from_handle(handle)
+            record = PersonRecord(person)
+            events = self.__get_events(person)
+            self._dates.add_events(person, events)
+            self.__add_person_events(record, person, events)
+            self._model.add_person(record)
+        return record
+
+    def _add_family(self, handle):
+        """
+        Return the model record of a family, extracting it from the database
+        on first use.
+        """
+        record = self._model.families.get(handle)
+        if record is None:
+            family = self.database.get_family_from_handle(handle)
+            record = FamilyRecord(family)
+            events = self.__get_events(family)
+            self._dates.add_events(family, events)
+            (marriage_ref, marriage_event) = \
+                self.__get_marriage_event(record, family, events)
+            if marriage_ref:
+                (marriage_type, marriage_date, marriage_place, _) = \
+                    self.__get_simple_event(
+                        record, marriage_ref, marriage_event)
                 if marriage_type.is_marriage():
                     symbol = MARRIED_SYMBOL
                 elif marriage_type.is_marriage_fallback():
                     symbol = ENGAGED_SYMBOL
                 else:
                     symbol = "?"
-                self.doc.write_text(symbol)
+                record.marriage = (symbol, marriage_date, marriage_place)
+            self._model.add_family(record)
+        return record
+
+    def __get_events(self, obj):
+        """
+        Return the events of a person or family in the order of its event
+        references, each fetched once for all uses while extracting it.
+        """
+        return [self.database.get_event_from_handle(event_ref.ref)
+                for event_ref in obj.get_event_ref_list()]
+
+    def __add_person_events(self, record, person, events):
+        birth_data = {'sym':'', 'date':'', 'loc':''}
+        death_data = {'sym':'', 'date':'', 'loc':''}
+        # in event order, so the note text is the same in every run
+        vocation_list = OrderedDict()
+
+        for event_ref, event in zip(person.get_event_ref_list(), events):
+            (event_type, event_date, event_place, description) = \
+                self.__get_simple_event(record, event_ref, event)
+            if event_type.is_birth():
+                birth_data['sym'] = BORN_SYMBOL
+                birth_data['date'] = event_date
+                if event_place:
+                    birth_data['loc'] = event_place
+            elif event_type.is_baptism():
+                if not birth_data['sym']:
+                    birth_data['sym'] = BAPTIZED_SYMBOL
+                    birth_data['date'] = event_date
+                if not birth_data['loc'] and event_place:
+                    birth_data['loc'] = event_place
+
+            if event_type.is_death():
+                death_data['sym'] = DIED_SYMBOL
+                death_data['date'] = event_date
+                if event_place:
+                    death_data['loc'] = event_place
+            elif event_type.is_burial():
+                if not death_data['sym']:
+                    death_data['sym'] = BURIAL_SYMBOL
+                    death_data['date'] = event_date
+                if not birth_data['loc'] and event_place:
+                    death_data['loc'] = event_place
+
+            if event_type.value in (EventType.ELECTED, EventType.OCCUPATION):
+                vocation_list[description] = None
+
+        record.birth = (birth_data['sym'], birth_data['date'], birth_data['loc'])
+        record.death = (death_data['sym'], death_data['date'], death_data['loc'])
+
+        (heimatort_ref, heimatort_event) = \
+            self.__get_heimatort_event(person, events)
+        if heimatort_ref:
+            (_, _, record.heimatort, _) = \
+                self.__get_simple_event(record, heimatort_ref, heimatort_event)
+
+        self._notes.add_person(person, vocation_list)
+
+    def write_report(self):
+        """
+        Write one chronicle per center person. The first one goes to the
+        report document, the others to documents named after the output
+        file and the center person. With several render processes, the
+        other chronicles are written by worker processes while the first
+        one is written here: from a current snapshot, else each by a report
+        run of its own on the database files.
+        """
+        if self._memory_limit:
+            self.__write_streaming()
+            return
+
+        chronicles = self._chronicles
+        output = self.options_class.get_output()
+        executor = None
+        if self._shard_ids:
+            executor = _get_report_executor(
+                self.__get_database_path(), self._workers,
+                self.__get_shard_option_values(),
+                self.doc.get_style_sheet(), self.doc.paper)
+            futures = OrderedDict(
+                (executor.submit(
+                    _write_report_chronicle, root_id,
+                    _get_chronicle_filename(output, root_id)), root_id)
+                for root_id in self._shard_ids)
+        elif self._workers > 1 and len(chronicles) > 1 and output:
+            reason = self.__get_serial_reason()
+            if reason is None:
+                executor = _get_snapshot_executor(
+                    self._snapshot.filename, self._workers)
+                futures = _submit_chronicles(
+                    executor, chronicles[1:], output,
+                    self.doc.tables_per_part)
+                chronicles = chronicles[:1]
             else:
-                # default, in case only spouse is known
-                self.doc.write_text(MARRIED_SYMBOL)
-            self.doc.end_cell()
-
-            self.doc.start_cell('Family-Cell')
-            self.doc.write_text(marriage_date)
-            self.doc.end_cell()
-
-            if show_place:
-                self.doc.start_cell('Family-Cell')
-                self.doc.write_text(marriage_place)
-                self.doc.end_cell()
+                LOG.info("Chronicles written one after the other: %s", reason)
+
+        try:
+            self.__write_chronicles(chronicles)
+            if executor is not None:
+                with self._timer.phase('sharded chronicles'
+                                       if self._shard_ids else
+                                       'sharded render'):
+                    _collect_chronicles(futures)
+        finally:
+            if executor is not None:
+                # chronicles not started yet are dropped after a failure
+                for future in futures:
+                    future.cancel()
+                executor.shutdown()
+
+    def __get_serial_reason(self):
+        """
+        Return why the further chronicles are not written by worker
+        processes, None if they are.
+        """
+        if self._fragments is not None:
+            return "the fragment cache is used"
+        if self._snapshot_current:
+            if self._row_formats:
+                return "row formats are written"
+            return None
+        if self.__get_database_path() is None:
+            return "the database has no files the worker processes can read"
+        return None
+
+    def __get_database_path(self):
+        """Return the directory of the database files, None if in memory"""
+        save_path = self.database.get_save_path()
+        if not save_path or not os.path.isdir(save_path):
+            return None
+        return save_path
+
+    def __get_shard_option_values(self):
+        """
+        Return the option values of the report runs writing the further
+        chronicles: the ones of this report for a single center person
+        written without worker processes.
+        """
+        menu = self.options_class.menu
+        option_values = {
+            name: menu.get_option_by_name(name).get_value()
+            for name in menu.get_all_option_names()}
+        option_values.update(
+            pids="", filter=0, lineage_size=0, workers=1, snapshot="",
+            profile="")
+        return option_values
+
+    def __write_chronicles(self, chronicles):
+        """Write the given chronicles in this process"""
+        for (chronicle_idx, (root_id, person_id_list, appearance_list)) in \
+            enumerate(chronicles):
+            self._person_id_list = person_id_list
+            self._person_appearance_list = appearance_list
+            self.__set_person_positions()
+            if chronicle_idx == 0 or not self.options_class.get_output():
+                doc = self.doc
+            else:
+                doc = self.__open_chronicle_doc(root_id)
+
+            renderer = ChronicleRenderer(
+                doc, self._model, self._notes, self._person_positions)
+            row_docs = self.__open_row_docs(chronicle_idx, root_id)
+            if row_docs:
+                renderer.doc = TeeDoc([doc] + row_docs)
+                self.__write_serial(renderer)
+            elif self._fragments is not None:
+                self.__write_cached(renderer)
+            elif self._workers > 1 and len(self._person_id_list) > 1:
+                for fragment in self.__render_parallel(
+                        renderer, self._person_id_list):
+                    doc.write_fragment(fragment)
+            elif self._pipeline:
+                if self._timing:
+                    with self._timer.phase('pipeline'):
+                        self.__write_pipelined(renderer)
+                else:
+                    self.__write_pipelined(renderer)
+            else:
+                self.__write_serial(renderer)
+
+            if doc is not self.doc:
+                doc.close()
+            for row_doc in row_docs:
+                row_doc.close()
+
+    def __write_serial(self, renderer):
+        """Write the family tables one after the other"""
+        if self._timing or self.fetch_counter is not None:
+            for person_id in self._person_id_list:
+                person = self._model.get_person_from_gramps_id(person_id)
+                if self.fetch_counter is not None:
+                    self.fetch_counter.person = person_id
+                if self._timing:
+                    with self._timer.phase('render', person_id):
+                        renderer.write_person(person)
+                else:
+                    renderer.write_person(person)
         else:
-            self.doc.start_cell('Family-Cell')
-            self.doc.end_cell()
-            self.doc.start_cell('Family-Cell')
-            self.doc.end_cell()
-            if show_place:
-                self.doc.start_cell('Family-Cell')
-                self.doc.end_cell()
+            for person_id in self._person_id_list:
+                person = self._model.get_person_from_gramps_id(person_id)
+                renderer.write_person(person)
 
+    def __write_streaming(self):
+        """
+        Write the chronicles ordered by __begin_streaming. The family tables
+        are extracted from the database and rendered one at a time.
+        """
+        for (chronicle_idx, (root_id, sorter, table_ids)) in \
+            enumerate(self._chronicles):
+            if chronicle_idx == 0 or not self.options_class.get_output():
+                doc = self.doc
+            else:
+                doc = self.__open_chronicle_doc(root_id)
+
+            row_docs = self.__open_row_docs(chronicle_idx, root_id)
+            tables = self.__extract_streaming(sorter, table_ids)
+            if self._pipeline and not row_docs:
+                scratch_doc = SimpleLaTeXDoc(None, None, [])
+                def render(table, table_ids=table_ids):
+                    (model, notes, person_id) = table
+                    return _render_fragment(ChronicleRenderer(
+                        scratch_doc, model, notes, table_ids), person_id)
+                if self._timing:
+                    with self._timer.phase('pipeline'):
+                        _run_pipeline(tables, render, doc.write_fragment)
+                else:
+                    _run_pipeline(tables, render, doc.write_fragment)
+            else:
+                target = TeeDoc([doc] + row_docs) if row_docs else doc
+                for (model, notes, person_id) in tables:
+                    renderer = ChronicleRenderer(
+                        target, model, notes, table_ids)
+                    person = model.get_person_from_gramps_id(person_id)
+                    if self._timing:
+                        with self._timer.phase('render', person_id):
+                            renderer.write_person(person)
+                    else:
+                        renderer.write_person(person)
 
-    def __get_simple_name(self, person):
-        name = person.get_primary_name()
-        first_name = name.first_name
-        surname = name.get_surname()
-        return (first_name, surname)
+            if doc is not self.doc:
+                doc.close()
+            for row_doc in row_docs:
+                row_doc.close()
+            sorter.close()
+            table_ids.close()
 
-    def __get_simple_event(self, event_ref):
+    def __extract_streaming(self, sorter, table_ids):
+        """
+        Extract the family tables of the persons of a sorter one at a time
+        and yield them as (model, notes, gramps_id). The notes shown in a
+        table are loaded with it. Tables dropped from table_ids are skipped.
+        """
+        for (_, _, person_id) in sorter:
+            if self._maternal_lines and person_id not in table_ids:
+                continue
+            if self.fetch_counter is not None:
+                self.fetch_counter.person = person_id
+            if self._timing:
+                with self._timer.phase('extraction'):
+                    self.__extract_alone(person_id)
+            else:
+                self.__extract_alone(person_id)
+            yield (self._model, self._notes, person_id)
+
+    def __extract_alone(self, person_id):
+        """Extract the family table of a person to a model of its own"""
+        self._model = ChronicleModel()
+        self._dates = EventDateTable(self.database)
+        self._notes = PersonNoteIndex(self.database)
+        person = self.database.get_person_from_gramps_id(person_id)
+        self._extract_table(person)
+        self._dates.compute()
+        self._model.resolve_dates(self._dates.get_text)
+        self.__load_notes([person_id])
+
+    def __write_pipelined(self, renderer):
+        """
+        Write the family tables in three overlapping stages: the notes of
+        the next tables are loaded here while a thread renders the tables
+        and another one writes them to the document.
+        """
+        scratch = ChronicleRenderer(
+            SimpleLaTeXDoc(None, None, []), self._model, self._notes,
+            self._person_positions)
+        _run_pipeline(
+            self.__prefetch_notes(self._person_id_list),
+            lambda person_id: _render_fragment(scratch, person_id),
+            renderer.doc.write_fragment)
+
+    def __prefetch_notes(self, person_ids):
+        """Load the notes of the family tables of the persons one by one"""
+        for person_id in person_ids:
+            self.__load_notes([person_id])
+            yield person_id
+
+    def __open_row_docs(self, chronicle_idx, root_id):
+        """
+        Open the documents a chronicle is also written to as plain rows,
+        named like the LaTeX file with the extension of their format.
+        """
+        output = self.options_class.get_output()
+        if not output:
+            return []
+        if chronicle_idx > 0:
+            output = _get_chronicle_filename(output, root_id)
+        row_docs = []
+        for (extension, doc_class) in self._row_formats:
+            row_doc = doc_class()
+            row_doc.open(os.path.splitext(output)[0] + extension)
+            row_docs.append(row_doc)
+        return row_docs
+
+    def __open_chronicle_doc(self, root_id):
+        doc = SimpleLaTeXDoc(self.doc.get_style_sheet(), self.doc.paper, [])
+        doc.timer = self.doc.timer
+        doc.tables_per_part = self.doc.tables_per_part
+        doc.open(_get_chronicle_filename(
+            self.options_class.get_output(), root_id))
+        return doc
+
+    def __load_notes(self, person_ids):
+        """
+        Load the notes of all persons written as parents in the family tables
+        of the given persons.
+        """
+        renderer = ChronicleRenderer(None, self._model, self._notes, {})
+        for person_id in person_ids:
+            person = self._model.get_person_from_gramps_id(person_id)
+            for handle in renderer.get_parent_handles(person):
+                self._notes.get_notes(handle)
+
+    def __write_cached(self, renderer):
+        """
+        Write the family tables from the fragment cache. Only the tables
+        whose fingerprint is not cached are rendered.
+        """
+        fingerprints = []
+        dirty_ids = []
+        for person_id in self._person_id_list:
+            person = self._model.get_person_from_gramps_id(person_id)
+            fingerprint = renderer.get_fingerprint(person)
+            if fingerprint not in self._fragments:
+                dirty_ids.append(person_id)
+                fingerprint = (fingerprint,)
+            fingerprints.append(fingerprint)
+
+        if self._workers > 1 and len(dirty_ids) > 1:
+            fragments = self.__render_parallel(renderer, dirty_ids)
+        else:
+            scratch = ChronicleRenderer(
+                SimpleLaTeXDoc(None, None, []), self._model, self._notes,
+                self._person_positions)
+            fragments = (
+                _render_fragment(scratch, person_id)
+                for person_id in dirty_ids)
+        try:
+            for fingerprint in fingerprints:
+                if isinstance(fingerprint, tuple):
+                    fragment = next(fragments)
+                    self._fragments.put(fingerprint[0], fragment)
+                else:
+                    fragment = self._fragments.get(fingerprint)
+                renderer.doc.write_fragment(fragment)
+        finally:
+            # the last fragment is taken without exhausting the generator
+            fragments.close()
+        LOG.info("%d of %d family tables rendered",
+                 len(dirty_ids), len(fingerprints))
+
+    def __render_parallel(self, renderer, person_ids):
+        """
+        Render the family tables of the given persons in a pool of worker
+        processes and yield them in order. The workers only receive the
+        model, so all notes shown are loaded beforehand.
+        """
+        self.__load_notes(person_ids)
+        chunksize = max(1, len(person_ids) // (self._workers * 8))
+        with ProcessPoolExecutor(
+                max_workers=self._workers,
+                mp_context=_get_worker_context(),
+                initializer=_init_render_worker,
+                initargs=(self._model, self._notes,
+                          self._person_positions)) as executor, \
+            self._timer.phase('parallel render'):
+            for fragment in executor.map(
+                    _render_family_table, person_ids, chunksize=chunksize):
+                yield fragment
+
+    def end_report(self):
+        for method, (hits, misses) in \
+            sorted(self.database.get_statistics().items()):
+            LOG.info("%s: %d hits, %d misses", method, hits, misses)
+        if self._fragments is not None:
+            self._fragments.close()
+        if self._stream_directory is not None:
+            shutil.rmtree(self._stream_directory, ignore_errors=True)
+        with self._timer.phase('end report'):
+            Report.end_report(self)
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self._profile_file)
+            output = io.StringIO()
+            pstats.Stats(self._profile, stream=output).sort_stats(
+                'cumulative').print_stats(20)
+            LOG.info("Profile written to %s\n%s",
+                     self._profile_file, output.getvalue())
+        if self._timing:
+            self._timer.log(sum(
+                len(person_id_list)
+                for (_, person_id_list, _) in self._chronicles))
+        if self.fetch_counter is not None:
+            self.__log_fetches()
+
+    def __log_fetches(self):
+        for obj_type, count in \
+            sorted(self.fetch_counter.get_counts().items()):
+            LOG.info("%s: %d fetches, at most %d of one object", obj_type,
+                     count, self.fetch_counter.get_max_fetches(obj_type))
+        LOG.info("%d repeated fetches",
+                 self.fetch_counter.get_repeated_fetches())
+        person_counts = self.fetch_counter.get_person_counts()
+        for person_id in heapq.nlargest(
+                SLOWEST_TABLES, person_counts, key=person_counts.get):
+            LOG.info("fetches for %s: %d", person_id, person_counts[person_id])
+
+    def __get_simple_event(self, record, event_ref, event):
+        """
+        Return type, date placeholder, place text and description of the
+        event of an event reference. The change times of the event and its
+        place are added to the given model record.
+        """
         if event_ref:
-            event = self.database.get_event_from_handle(event_ref.ref)
+            record.change = max(record.change, event.get_change_time())
             event_date = event.get_date_object()
-            date_text = self._get_date_text(event_date)
+            # resolved into the date text by ChronicleModel.resolve_dates
+            date_text = event_ref.ref
+            self._dates.add_event(event_ref.ref, event)
             # date_text = datehandler.displayer.display(event_date)
             place_handle = event.get_place_handle()
             description = event.get_description()
@@ -603,57 +2673,198 @@ class FamilyChronicles(Report):
             description = ""
 
         if event_ref and place_handle:
-            place = self.database.get_place_from_handle(place_handle)
-            place_text = place_displayer.display(
-                self.database, place, event_date)
+            place_text = self._place_cache.display(place_handle, event_date)
+            record.change = max(
+                record.change, self._place_cache.get_change_time(place_handle))
         else:
             place_text = ""
 
         return event_type, date_text, place_text, description
 
-    def _get_date_text(self, date_obj):
-        date_text = ""
-        if date_obj.get_modifier() == GrampsDate.MOD_NONE:
-            if date_obj.dateval[0] == 0:
-                if date_obj.dateval[1] == 0:
-                    if date_obj.dateval[2] == 0:
-                        date_text = ""
-                    else:
-                        date_text = "{}".format(date_obj.dateval[2])
-                else:
-                    date_text = "{}.{}".format(date_obj.dateval[1], date_obj.dateval[2])
-            else:
-                date_text = "{}.{}.{}".format(
-                    date_obj.dateval[0],
-                    date_obj.dateval[1],
-                    date_obj.dateval[2])
-        # if date_obj.get_modifier() == GrampsDate.MOD_BEFORE:
-        #     date_text = "vor " + date_text
-        # elif date_obj.get_modifier() == GrampsDate.MOD_AFTER:
-        #     date_text = "nach " + date_text
-        return date_text
-
-    def __get_marriage_event_ref(self, family):
-        marriage_event_ref = None
-        event_ref_list = family.get_event_ref_list()
-        for event_ref in event_ref_list:
-            event = self.database.get_event_from_handle(event_ref.ref)
+    def __get_marriage_event(self, record, family, events):
+        for event_ref, event in zip(family.get_event_ref_list(), events):
+            record.change = max(record.change, event.get_change_time())
             event_type = event.get_type()
             if event_type.is_marriage() or event_type.is_marriage_fallback():
-                marriage_event_ref = event_ref
-                break
-        return marriage_event_ref
+                return (event_ref, event)
+        return (None, None)
 
-    def __get_heimatort_event_ref(self, person):
-        heimatort_event_ref = None
-        event_ref_list = person.get_event_ref_list()
-        for event_ref in event_ref_list:
-            event = self.database.get_event_from_handle(event_ref.ref)
-            event_type = event.get_type()
-            if event_type.value == EventType.CENSUS:
-                heimatort_event_ref = event_ref
-                break
-        return heimatort_event_ref
+    def __get_heimatort_event(self, person, events):
+        for event_ref, event in zip(person.get_event_ref_list(), events):
+            if event.get_type().value == EventType.CENSUS:
+                return (event_ref, event)
+        return (None, None)
+
+def render_snapshot(filename, output, workers=1, tables_per_part=0):
+    """
+    Write the chronicles stored in a snapshot file without opening the
+    Gramps database. Further chronicles of a batch run are written to files
+    named like the ones of the report, with several workers by a pool of
+    processes each reading the snapshot. With tables_per_part, the tables
+    are split into part files like the report does. Return the files
+    written.
+    """
+    snapshot = ChronicleSnapshot(filename).load()
+    if snapshot is None:
+        raise ValueError("No valid chronicle snapshot: " + filename)
+    (model, notes, chronicles) = snapshot
+    if workers > 1 and len(chronicles) > 1:
+        with _get_snapshot_executor(filename, workers) as executor:
+            futures = _submit_chronicles(
+                executor, chronicles[1:], output, tables_per_part)
+            _write_chronicle(
+                output, model, notes, chronicles[0][1], tables_per_part)
+            return [output] + _collect_chronicles(futures)
+
+    filenames = []
+    for (chronicle_idx, (root_id, person_id_list, _)) in \
+        enumerate(chronicles):
+        if chronicle_idx == 0:
+            filenames.append(output)
+        else:
+            filenames.append(_get_chronicle_filename(output, root_id))
+        _write_chronicle(
+            filenames[-1], model, notes, person_id_list, tables_per_part)
+    return filenames
+
+def _write_chronicle(filename, model, notes, person_id_list,
+                     tables_per_part=0):
+    """Write the family tables of a chronicle to a new document"""
+    doc = SimpleLaTeXDoc(None, None, [])
+    doc.tables_per_part = tables_per_part
+    doc.open(filename)
+    person_positions = {
+        person_id: position
+        for position, person_id in enumerate(person_id_list)}
+    renderer = ChronicleRenderer(doc, model, notes, person_positions)
+    for person_id in person_id_list:
+        renderer.write_person(model.get_person_from_gramps_id(person_id))
+    doc.close()
+
+_WORKER_SNAPSHOT = None
+
+def _get_snapshot_executor(filename, workers):
+    """
+    Return a pool of processes writing chronicles from a snapshot file,
+    each loading the records of one chronicle at a time.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=_get_worker_context(),
+        initializer=_init_snapshot_worker,
+        initargs=(filename,))
+
+def _init_snapshot_worker(filename):
+    global _WORKER_SNAPSHOT
+    _WORKER_SNAPSHOT = ChronicleSnapshot(filename)
+
+def _write_snapshot_chronicle(root_id, filename, tables_per_part):
+    """Write a chronicle of the snapshot in a worker process"""
+    (model, notes, person_id_list) = \
+        _WORKER_SNAPSHOT.load_chronicle(root_id)
+    _write_chronicle(filename, model, notes, person_id_list, tables_per_part)
+    return filename
+
+_WORKER_REPORT = None
+
+def _get_report_executor(save_path, workers, option_values, style_sheet,
+                         paper):
+    """
+    Return a pool of processes writing chronicles by report runs of their
+    own with the given option values, each opening the database in the
+    given directory read-only once.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=_get_worker_context(),
+        initializer=_init_report_worker,
+        initargs=(save_path, option_values, style_sheet, paper))
+
+def _init_report_worker(save_path, option_values, style_sheet, paper):
+    global _WORKER_REPORT
+    database = make_database(get_dbid_from_path(save_path))
+    database.load(save_path, mode=DBMODE_R)
+    _WORKER_REPORT = (database, option_values, style_sheet, paper)
+
+def _write_report_chronicle(root_id, filename):
+    """
+    Extract and write the chronicle of a center person in a worker process
+    """
+    (database, option_values, style_sheet, paper) = _WORKER_REPORT
+    options = FamilyChroniclesOptions("Family Chronicles", database)
+    options.handler = OptionHandler(options.name, options.options_dict)
+    for (name, value) in option_values.items():
+        options.menu.get_option_by_name(name).set_value(value)
+    options.menu.get_option_by_name('pid').set_value(root_id)
+    options.set_document(SimpleLaTeXDoc(style_sheet, paper, []))
+    options.set_output(filename)
+    report = FamilyChronicles(database, options, User())
+    report.begin_report()
+    report.write_report()
+    report.end_report()
+    return filename
+
+def _submit_chronicles(executor, chronicles, output, tables_per_part=0):
+    """
+    Submit the chronicles to the worker processes, largest first, and
+    return the futures with their center person ids.
+    """
+    futures = OrderedDict()
+    for (root_id, person_id_list, _) in \
+        sorted(chronicles, key=lambda chronicle: -len(chronicle[1])):
+        future = executor.submit(
+            _write_snapshot_chronicle, root_id,
+            _get_chronicle_filename(output, root_id), tables_per_part)
+        futures[future] = root_id
+    return futures
+
+def _collect_chronicles(futures):
+    """
+    Wait for the chronicles written by the worker processes and log the
+    progress. Return the files written; the chronicles that failed are
+    logged and reported together at the end.
+    """
+    filenames = []
+    failed = []
+    for (done, future) in enumerate(as_completed(futures), 1):
+        try:
+            filenames.append(future.result())
+        except Exception as error:
+            LOG.error("Chronicle %s failed: %s", futures[future], error)
+            failed.append(futures[future])
+        LOG.info("%d of %d chronicles written", done, len(futures))
+    if failed:
+        raise RuntimeError("Chronicles failed: " + ", ".join(failed))
+    return sorted(filenames)
+
+_WORKER_RENDERER = None
+
+def _get_worker_context():
+    """
+    Prefer forked workers, which inherit the loaded plugin module instead of
+    importing it by name.
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+def _init_render_worker(model, notes, person_positions):
+    global _WORKER_RENDERER
+    _WORKER_RENDERER = ChronicleRenderer(
+        SimpleLaTeXDoc(None, None, []), model, notes, person_positions)
+
+def _render_fragment(renderer, person_id):
+    """
+    Render the family table of a person with a renderer writing to a
+    document without backend and return it.
+    """
+    person = renderer._model.get_person_from_gramps_id(person_id)
+    renderer.write_person(person)
+    return renderer.doc.pop_fragment()
+
+def _render_family_table(person_id):
+    """Render the family table of a person in a worker process"""
+    return _render_fragment(_WORKER_RENDERER, person_id)
 
 class FamilyChroniclesOptions(MenuReportOptions):
     """
@@ -672,6 +2883,133 @@ class FamilyChroniclesOptions(MenuReportOptions):
             "The person whose partners and children are printed")
         menu.add_option(category_name, "pid", self.__pid)
 
+        pids = PersonListOption("Additional center persons")
+        pids.set_help(
+            "Further persons a chronicle is written for in the same run")
+        menu.add_option(category_name, "pids", pids)
+
+        self.__filter = FilterOption("Center person filter", 0)
+        self.__filter.set_help(
+            "Select the persons a chronicle is written for")
+        menu.add_option(category_name, "filter", self.__filter)
+        self.__pid.connect('value-changed', self.__update_filters)
+        self.__update_filters()
+
+        lineage_size = NumberOption("Minimum lineage size", 0, 0, 1000000)
+        lineage_size.set_help(
+            "Also write a chronicle for the head of every lineage, i.e. the "
+            "persons descending from the same top family, with at least this "
+            "many persons. 0 writes no lineage chronicles")
+        menu.add_option(category_name, "lineage_size", lineage_size)
+
+        maternal_lines = BooleanOption("Follow maternal lines", False)
+        maternal_lines.set_help(
+            "Also include the descendants of the daughters, i.e. the "
+            "children of families in which a descendant is the mother. "
+            "Descendants reached on several lines are written once, and a "
+            "family of two descendants in the table of the father")
+        menu.add_option(category_name, "maternal_lines", maternal_lines)
+
+        tables_per_part = NumberOption(
+            "Family tables per include file", 0, 0, 100000)
+        tables_per_part.set_help(
+            "Write the family tables to files of this many tables each, "
+            "which the LaTeX file includes with \\include. Unchanged files "
+            "are not rewritten, so \\includeonly and build tools can skip "
+            "them. 0 writes all tables to the LaTeX file")
+        menu.add_option(category_name, "tables_per_part", tables_per_part)
+
+        for (name, extension, _) in ROW_FORMATS:
+            row_format = BooleanOption(
+                "Also write " + extension[1:].upper(), False)
+            row_format.set_help(
+                "Write the family tables also to a {} file next to the "
+                "LaTeX file, one entry per table row".format(
+                    extension[1:].upper()))
+            menu.add_option(category_name, name, row_format)
+
+        category_name = "Performance"
+        cache_size = NumberOption(
+            "Object cache size", DEFAULT_CACHE_SIZE, 0, 10000000, 1000)
+        cache_size.set_help(
+            "Number of database objects kept in memory during the report run")
+        menu.add_option(category_name, "cache_size", cache_size)
+
+        place_cache_size = NumberOption(
+            "Place text cache size", DEFAULT_PLACE_CACHE_SIZE, 0, 1000000, 100)
+        place_cache_size.set_help(
+            "Number of places whose displayed texts are kept in memory")
+        menu.add_option(category_name, "place_cache_size", place_cache_size)
+
+        workers = NumberOption("Render processes", 1, 1, 64)
+        workers.set_help(
+            "Number of processes rendering family tables in parallel. "
+            "Further chronicles such as lineages are extracted and written "
+            "in parallel instead, from the snapshot file if one is set")
+        menu.add_option(category_name, "workers", workers)
+
+        pipeline = BooleanOption("Pipelined output", False)
+        pipeline.set_help(
+            "Load the data of the next family tables, render tables and write "
+            "them to the output file in three overlapping stages. Helps when "
+            "the database or the output file are on a slow network share")
+        menu.add_option(category_name, "pipeline", pipeline)
+
+        memory_limit = NumberOption("Memory limit (MB)", 0, 0, 1000000, 64)
+        memory_limit.set_help(
+            "Approximate memory used for ordering and caching in whole-"
+            "database chronicles. Persons are then ordered with an external "
+            "sort on disk and family tables are extracted one at a time; "
+            "fragment cache, snapshot and render processes are not used. "
+            "0 keeps all chronicles in memory")
+        menu.add_option(category_name, "memory_limit", memory_limit)
+
+        fragment_cache = DestinationOption("Fragment cache directory", "")
+        fragment_cache.set_directory_entry(True)
+        fragment_cache.set_help(
+            "Directory keeping rendered family tables between runs; only "
+            "tables whose persons, families, events, places or notes "
+            "changed are rendered again. Leave empty to render all tables")
+        menu.add_option(category_name, "fragment_cache", fragment_cache)
+
+        snapshot = DestinationOption("Snapshot file", "")
+        snapshot.set_extension(".sqlite")
+        snapshot.set_help(
+            "File keeping the extracted chronicles between runs; it is used "
+            "as long as the database files are unchanged. Leave empty to "
+            "extract the chronicles on every run")
+        menu.add_option(category_name, "snapshot", snapshot)
+
+        timing = BooleanOption("Log phase timings", False)
+        timing.set_help(
+            "Log wall and CPU time of the report phases at the end of the "
+            "run; also switched on by the environment variable "
+            + TIMING_VARIABLE)
+        menu.add_option(category_name, "timing", timing)
+
+        profile = DestinationOption("Profile file", "")
+        profile.set_extension(".pstats")
+        profile.set_help(
+            "File the cProfile statistics of the run are written to; also "
+            "set by the environment variable " + PROFILE_VARIABLE + ". "
+            "Leave empty to run without profiler")
+        menu.add_option(category_name, "profile", profile)
+
+        count_fetches = BooleanOption("Count database fetches", False)
+        count_fetches.set_help(
+            "Count the objects fetched from the database per type, object "
+            "and person and log the counts at the end of the run")
+        menu.add_option(category_name, "count_fetches", count_fetches)
+
+    def __update_filters(self):
+        """
+        Update the filter list based on the selected person
+        """
+        gid = self.__pid.get_value()
+        person = self.__db.get_person_from_gramps_id(gid)
+        filter_list = utils.get_person_filters(person, include_single=True)
+        self.__filter.set_filters(filter_list)
+
     def make_default_style(self, default_style):
         """Make default output style for the Family Sheet Report."""
 
@@ -686,31 +3024,149 @@ class FamilyChroniclesOptions(MenuReportOptions):
 
         table = docgen.TableStyle()
         table.set_width(100)
-        table.set_columns(15)
-        table.set_column_width(0, 7)
-        table.set_column_width(1, 7)
-        table.set_column_width(2, 6)
-        table.set_column_width(3, 7)
-        table.set_column_width(4, 7)
-        table.set_column_width(5, 6)
-        table.set_column_width(6, 7)
-        table.set_column_width(7, 7)
-        table.set_column_width(8, 6)
-        table.set_column_width(9, 7)
-        table.set_column_width(10, 7)
-        table.set_column_width(11, 6)
-        table.set_column_width(12, 7)
-        table.set_column_width(13, 7)
-        table.set_column_width(14, 6)
+        table.set_columns(len(FAMILY_TABLE_COLUMNS))
+        for (index, (width, _)) in enumerate(FAMILY_TABLE_COLUMNS):
+            table.set_column_width(index, width)
         default_style.add_table_style('Family-Table', table)
 
 
         cell = docgen.TableCellStyle()
         default_style.add_cell_style('Family-Cell', cell)
 
+# Width in percent and LaTeX column specification of the family table
+FAMILY_TABLE_COLUMNS = (
+    (7, r"p{\namewidth}"),
+    (7, r"p{\symbolwidth}"),
+    (6, r">{\raggedleft\arraybackslash}p{\datewidth}"),
+    (7, r"p{\locationwidth}"),
+    (7, r"p{\gapwidth}"),
+    (6, r">{\centering}p{\symbolwidth}"),
+    (7, r">{\raggedleft\arraybackslash}p{\datewidth}"),
+    (7, r"p{\locationwidth}"),
+    (6, r"p{\gapwidth}"),
+    (7, r">{\centering}p{\symbolwidth}"),
+    (7, r">{\raggedleft\arraybackslash}p{\datewidth}"),
+    (6, r"p{\namewidth}"),
+    (7, r"p{\heimatortwidth}"),
+    (7, r"p{\gapwidth}"),
+    (6, r"p{\referencewidth}"),
+)
+TABLE_BEGIN = (
+    r"\begin{table}" + "\n" + r"\begin{tabular}{" + "\n" +
+    "".join(spec + "\n" for (_, spec) in FAMILY_TABLE_COLUMNS) +
+    r"}" + "\n")
+ROW_END = r"\\" + "\n"
+
+def _escape_braces(text):
+    return text.replace("{", "{{").replace("}", "}}")
+
+class RowTemplate:
+    """
+    Table row compiled into a single format string.
+
+    A row is given as a sequence of cells (span, column format, pattern).
+    The pattern is a str.format pattern for the cell content; empty cells
+    have an empty pattern and take no values. The kind of row and the names
+    of its values are used by the documents writing plain rows. Values are
+    format neutral; symbols and page references are turned into LaTeX by
+    the markup functions of ROW_MARKUP when the row is rendered.
+    """
+    def __init__(self, cells, kind, fields):
+        self.kind = kind
+        self.fields = fields
+        patterns = []
+        for (span, column_format, pattern) in cells:
+            if span > 1:
+                pattern = _escape_braces(
+                    r"\multicolumn{" + str(span) + "}{" + column_format +
+                    "}{") + pattern + "}}"
+            patterns.append(pattern)
+        self.pattern = "&".join(patterns) + ROW_END
+        self._markup = tuple(
+            (idx, ROW_MARKUP[field]) for (idx, field) in enumerate(fields)
+            if field in ROW_MARKUP)
+        if self._markup:
+            self.render = self.__render
+        else:
+            self.render = self.pattern.format
+
+    def __render(self, *values):
+        values = list(values)
+        for (idx, markup) in self._markup:
+            values[idx] = markup(values[idx])
+        return self.pattern.format(*values)
+
+EMPTY_CELL = (1, 'l', "")
+VALUE_CELL = (1, 'l', "{}")
+PERSON_CELLS = (VALUE_CELL,) * 4 + (EMPTY_CELL,) + (VALUE_CELL,) * 3
+NOTE_CELL = (6, 'N', "{}")
+# Marriage columns of a child row: symbol, date, spouse, Heimatort of the
+# spouse, gap and page reference
+CHILD_MARRIAGE_CELLS = (
+    EMPTY_CELL, VALUE_CELL, VALUE_CELL, (1, 'l', "{} {} "), VALUE_CELL,
+    EMPTY_CELL, VALUE_CELL)
+CHILD_MARRIAGE_NO_SPOUSE_CELLS = (
+    EMPTY_CELL, VALUE_CELL, VALUE_CELL, (2, 'l', ""), EMPTY_CELL, VALUE_CELL)
+
+PERSON_FIELDS = (
+    'name', 'birth_symbol', 'birth_date', 'birth_place',
+    'death_symbol', 'death_date', 'death_place')
+MARRIAGE_FIELDS = ('marriage_symbol', 'marriage_date')
+CHILD_MARRIAGE_FIELDS = MARRIAGE_FIELDS + (
+    'spouse_first_name', 'spouse_surname', 'spouse_heimatort', 'reference')
+CHILD_MARRIAGE_NO_SPOUSE_FIELDS = MARRIAGE_FIELDS + ('reference',)
+SYMBOL_FIELDS = ('birth_symbol', 'death_symbol', 'marriage_symbol')
+# Functions turning the values of these fields into LaTeX
+ROW_MARKUP = dict(
+    [(field, _get_latex_symbol) for field in SYMBOL_FIELDS],
+    reference=_get_page_reference)
+
+MAIN_PARENT_ROW = RowTemplate(
+    ((1, 'l', _escape_braces(r"\textbf{") + "{}" + _escape_braces("}")),) +
+    PERSON_CELLS[1:] + (EMPTY_CELL, NOTE_CELL),
+    'parent', PERSON_FIELDS + ('note',))
+# Person, gap, marriage symbol, date and place, Heimatort, empty columns
+SPOUSE_ROW = RowTemplate(
+    PERSON_CELLS + (EMPTY_CELL,) + (VALUE_CELL,) * 4 + ((2, 'l', ""),),
+    'spouse',
+    PERSON_FIELDS + MARRIAGE_FIELDS + ('marriage_place', 'heimatort'))
+NOTE_ROW = RowTemplate(((8, 'l', ""), EMPTY_CELL, NOTE_CELL), 'note', ('note',))
+MARRIAGE_SEPARATOR_ROW = RowTemplate(
+    ((1, 'l', "{}. Ehe"), (14, 'l', "")), 'marriage', ('marriage_number',))
+PARENTS_ROW = RowTemplate(
+    ((5, 'l', "{}"),) + (EMPTY_CELL,) * 9 + (VALUE_CELL,),
+    'parents', ('parents', 'reference'))
+CHILD_ROW = RowTemplate(PERSON_CELLS + ((7, 'l', ""),), 'child', PERSON_FIELDS)
+# Templates for the first and for further marriages of a child
+CHILD_MARRIAGE_ROW = (
+    RowTemplate(PERSON_CELLS + CHILD_MARRIAGE_CELLS,
+                'child', PERSON_FIELDS + CHILD_MARRIAGE_FIELDS),
+    RowTemplate(((8, 'l', ""),) + CHILD_MARRIAGE_CELLS,
+                'child marriage', CHILD_MARRIAGE_FIELDS))
+CHILD_MARRIAGE_NO_SPOUSE_ROW = (
+    RowTemplate(PERSON_CELLS + CHILD_MARRIAGE_NO_SPOUSE_CELLS,
+                'child', PERSON_FIELDS + CHILD_MARRIAGE_NO_SPOUSE_FIELDS),
+    RowTemplate(((8, 'l', ""),) + CHILD_MARRIAGE_NO_SPOUSE_CELLS,
+                'child marriage', CHILD_MARRIAGE_NO_SPOUSE_FIELDS))
+# Columns of the CSV output
+ROW_FIELDS = tuple(OrderedDict.fromkeys(
+    PERSON_FIELDS + ('note', 'parents') + MARRIAGE_FIELDS +
+    ('marriage_place', 'marriage_number', 'heimatort') +
+    CHILD_MARRIAGE_FIELDS))
+# Number of characters collected before they are written to the backend
+OUTPUT_BUFFER_SIZE = 1 << 20
+
 class SimpleLaTeXDoc(BaseDoc, TextDoc):
     """
     Document method handler.
+
+    Cells and rows are collected as lists of fragments and the output is
+    joined and handed to the backend in large chunks.
+
+    With tables_per_part set, the tables are written to part files of that
+    many tables each, named after the document and numbered, which the
+    document includes with \\include. A part file is only rewritten if its
+    content changed, so LaTeX and build tools can skip unchanged parts.
     """
 
     def __init__(self, styles, paper_style, track, uistate=None):
@@ -719,44 +3175,56 @@ class SimpleLaTeXDoc(BaseDoc, TextDoc):
         self._table_cells = []
         self._collect_cells = False
         self._open_cell = None
+        self._open_span = 1
+        self._output = []
+        self._output_size = 0
+        # PhaseTimer the document output is timed with, if any
+        self.timer = None
+        self.tables_per_part = 0
+        self._tables = 0
+        self._part_output = None
 
     def open(self, filename):
         """Opens the specified file, making sure that it has the
         extension of .tex"""
         self._backend = DocBackend(filename)
         self._backend.open()
-        # self._backend.write(
+        self._tables = 0
+        # self.__write(
         #     r"\documentclass[a4paper,landscape,10pt]{article}" + "\n")
-        self._backend.write(r"\documentclass[10pt]{extarticle}" + "\n")
-        self._backend.write(r"\usepackage[a4paper,landscape,left=2cm]{geometry}" + "\n")
-        self._backend.write(r"\usepackage{multirow}" + "\n")
-        self._backend.write(r"\usepackage{array}" + "\n")
-        self._backend.write(r"\usepackage{calc}" + "\n")
-        self._backend.write(r"\usepackage{genealogytree}" + "\n")
-        self._backend.write(r"\newcommand{\namewidth}{0.15\textwidth}" + "\n")
-        self._backend.write(r"\newcommand{\locationwidth}{0.09\textwidth}" + "\n")
-        self._backend.write(r"\newcommand{\datewidth}{0.07\textwidth}" + "\n")
-        self._backend.write(r"\newcommand{\symbolwidth}{0.005\textwidth}" + "\n")
-        self._backend.write(r"\newcommand{\referencewidth}{0.04\textwidth}" + "\n")
-        self._backend.write(r"\newcommand{\heimatortwidth}{0.12\textwidth}" + "\n")
-        self._backend.write(r"\newcommand{\gapwidth}{0.01\textwidth}" + "\n")
-        self._backend.write(r"\newcommand{\notewidth}{\symbolwidth+\datewidth+\namewidth+\heimatortwidth}" + "\n")
-        self._backend.write(r"\newcolumntype{N}{>{\raggedright\arraybackslash}p{\notewidth}}" + "\n")
-        self._backend.write(r"\begin{document}" + "\n")
-        self._backend.write(r"\newgeometry{left=1.5cm} % Ränder kleiner" + "\n")
+        self.__write(r"\documentclass[10pt]{extarticle}" + "\n")
+        self.__write(r"\usepackage[a4paper,landscape,left=2cm]{geometry}" + "\n")
+        self.__write(r"\usepackage{multirow}" + "\n")
+        self.__write(r"\usepackage{array}" + "\n")
+        self.__write(r"\usepackage{calc}" + "\n")
+        self.__write(r"\usepackage{genealogytree}" + "\n")
+        self.__write(r"\newcommand{\namewidth}{0.15\textwidth}" + "\n")
+        self.__write(r"\newcommand{\locationwidth}{0.09\textwidth}" + "\n")
+        self.__write(r"\newcommand{\datewidth}{0.07\textwidth}" + "\n")
+        self.__write(r"\newcommand{\symbolwidth}{0.005\textwidth}" + "\n")
+        self.__write(r"\newcommand{\referencewidth}{0.04\textwidth}" + "\n")
+        self.__write(r"\newcommand{\heimatortwidth}{0.12\textwidth}" + "\n")
+        self.__write(r"\newcommand{\gapwidth}{0.01\textwidth}" + "\n")
+        self.__write(r"\newcommand{\notewidth}{\symbolwidth+\datewidth+\namewidth+\heimatortwidth}" + "\n")
+        self.__write(r"\newcolumntype{N}{>{\raggedright\arraybackslash}p{\notewidth}}" + "\n")
+        self.__write(r"\begin{document}" + "\n")
+        self.__write(r"\newgeometry{left=1.5cm} % Ränder kleiner" + "\n")
 
 
     def close(self):
         """Clean up and close the document"""
-        self._backend.write(r"\end{document}")
+        if self._part_output is not None:
+            self.__end_part()
+        self.__write(r"\end{document}")
+        self.__flush()
         self._backend.close()
 
     def write_text(self, text, mark=None, links=False):
         """Write the text to the file"""
         if self._open_cell is None:
-            self._backend.write(text)
+            self.__write(text)
         else:
-            self.__append_to_cell(text)
+            self._open_cell.append(text)
 
     def start_paragraph(self, style_name, leader=None):
         """Paragraphs handling - A Gramps paragraph is any
@@ -768,50 +3236,25 @@ class SimpleLaTeXDoc(BaseDoc, TextDoc):
         pass
 
     def start_bold(self):
-        control = r"\textbf{"
-        if self._open_cell is None:
-            self._backend.write(control)
-        else:
-            self.__append_to_cell(control)
+        self.write_text(r"\textbf{")
 
     def end_bold(self):
         """End bold face"""
-        control = r"}"
-        if self._open_cell is None:
-            self._backend.write(control)
-        else:
-            self.__append_to_cell(control)
+        self.write_text(r"}")
 
     def start_table(self, name, style_name):
         """Begin new table"""
-        self._backend.write(r"\begin{table}" + "\n")
-        self._backend.write(
-            r"\begin{tabular}{" + "\n" + \
-            r"p{\namewidth}" + "\n" + \
-            r"p{\symbolwidth}" + "\n" + \
-            r">{\raggedleft\arraybackslash}p{\datewidth}" + "\n" + \
-            r"p{\locationwidth}" + "\n" + \
-            r"p{\gapwidth}" + "\n" + \
-            r">{\centering}p{\symbolwidth}" + "\n" + \
-            r">{\raggedleft\arraybackslash}p{\datewidth}" + "\n" + \
-            r"p{\locationwidth}" + "\n" + \
-            r"p{\gapwidth}" + "\n" + \
-            r">{\centering}p{\symbolwidth}" + "\n" + \
-            r">{\raggedleft\arraybackslash}p{\datewidth}" + "\n" + \
-            r"p{\namewidth}" + "\n" + \
-            r"p{\heimatortwidth}" + "\n" + \
-            r"p{\gapwidth}" + "\n" + \
-            r"p{\referencewidth}" + "\n" + \
-            r"}" + "\n")
+        self.__count_table()
+        self.__write(TABLE_BEGIN)
 
     def end_table(self, label=None):
         """Close the table environment"""
-        self._backend.write(r"\end{tabular}" + "\n")
+        self.__write(r"\end{tabular}" + "\n")
         if label:
             self.write_text(r"\label{" + label +"}")
-        # self._backend.write(r"\vspace{3.6cm}" + "\n")
-        # self._backend.write(r"\\\\\noindent\rule[0.6ex]{\linewidth}{1pt}" + "\n")
-        self._backend.write(r"\end{table}" + "\n")
+        # self.__write(r"\vspace{3.6cm}" + "\n")
+        # self.__write(r"\\\\\noindent\rule[0.6ex]{\linewidth}{1pt}" + "\n")
+        self.__write(r"\end{table}" + "\n")
 
     def start_row(self):
         """Begin a new row"""
@@ -819,28 +3262,27 @@ class SimpleLaTeXDoc(BaseDoc, TextDoc):
 
     def end_row(self):
         """End the row (new line)"""
-        self._backend.write("&".join(self._table_cells))
-
-        self._backend.write(r"\\" + "\n")
+        self.__write("&".join(self._table_cells) + ROW_END)
 
     def start_cell(self, style_name, span=1, format='l'):
         """Add an entry to the table.
         We always place our data inside braces
         for safety of formatting."""
-        self._open_cell = ("", 1)
+        self._open_cell = []
+        self._open_span = span
         # if span > 1:
         #     self._open_cell = (r"\multicolumn{" + \
         #                        "{}".format(span) + r"}{l}{", span)
         if span > 1:
-            self._open_cell = (r"\multicolumn" + \
-                "{{{}}}{{{}}}{{".format(span, format), span)
+            self._open_cell.append(r"\multicolumn" + \
+                "{{{}}}{{{}}}{{".format(span, format))
 
 
     def end_cell(self):
         """Prepares for next cell"""
-        if self._open_cell[1] > 1:
-            self._open_cell = (self._open_cell[0] + r"}", self._open_cell[1])
-        self._table_cells.append(self._open_cell[0])
+        if self._open_span > 1:
+            self._open_cell.append(r"}")
+        self._table_cells.append("".join(self._open_cell))
         self._open_cell = None
 
     def start_superscript(self):
@@ -858,10 +3300,194 @@ class SimpleLaTeXDoc(BaseDoc, TextDoc):
 
     def page_break(self):
         "Forces a page break, creating a new page"
-        self._backend.write(r"\newpage")
+        self.__write(r"\newpage")
 
     def make_pageref(self, label):
         self.write_text(r"\pageref{" + label +"}")
 
-    def __append_to_cell(self, text):
-        self._open_cell = (self._open_cell[0] + text, self._open_cell[1])
+    def write_row(self, template, values):
+        """Write a complete table row from a compiled RowTemplate"""
+        if self.timer is None:
+            self.__write(template.render(*values))
+        else:
+            with self.timer.phase('doc emission'):
+                self.__write(template.render(*values))
+
+    def write_fragment(self, fragment):
+        """Write output rendered by another document, see pop_fragment"""
+        if self._backend:
+            # fragments hold one complete table each
+            self.__count_table()
+        self.__write(fragment)
+
+    def get_table_count(self):
+        """Return the number of tables written since the document was opened"""
+        return self._tables
+
+    def pop_fragment(self):
+        """
+        Return and clear the output collected so far. Only used for documents
+        without backend, which collect their output instead of writing it.
+        """
+        fragment = "".join(self._output)
+        self._output = []
+        self._output_size = 0
+        return fragment
+
+    def __count_table(self):
+        """Start a new part file before every tables_per_part-th table"""
+        if self.tables_per_part and self._backend and \
+            self._tables % self.tables_per_part == 0:
+            if self._part_output is not None:
+                self.__end_part()
+            self._part_output = []
+        self._tables += 1
+
+    def __end_part(self):
+        """Write the current part file if changed and include it"""
+        (root, ext) = os.path.splitext(self._backend.filename)
+        name = "{}-part{:04d}".format(
+            os.path.basename(root),
+            (self._tables - 1) // self.tables_per_part + 1)
+        filename = os.path.join(os.path.dirname(root), name + ext)
+        text = "".join(self._part_output)
+        self._part_output = None
+        try:
+            with open(filename, encoding='utf-8') as part_file:
+                changed = part_file.read() != text
+        except OSError:
+            changed = True
+        if changed:
+            if self.timer is not None:
+                self.timer.start('doc I/O')
+            with open(filename, 'w', encoding='utf-8') as part_file:
+                part_file.write(text)
+            if self.timer is not None:
+                self.timer.stop('doc I/O')
+        self.__write(r"\include{" + name + "}\n")
+
+    def __write(self, text):
+        if self._part_output is not None:
+            self._part_output.append(text)
+            return
+        self._output.append(text)
+        self._output_size += len(text)
+        if self._output_size >= OUTPUT_BUFFER_SIZE and self._backend:
+            self.__flush()
+
+    def __flush(self):
+        if self.timer is not None:
+            self.timer.start('doc I/O')
+        if self._output:
+            self._backend.write("".join(self._output))
+        self._output = []
+        self._output_size = 0
+        if self.timer is not None:
+            self.timer.stop('doc I/O')
+
+class PlainRowDoc:
+    """
+    Document writing the rows of the family tables without layout. The rows
+    of a table are collected as dicts of plain values and handed to
+    write_table once the table is complete.
+    """
+    def __init__(self):
+        self._file = None
+        self._rows = []
+
+    def open(self, filename):
+        self._file = open(filename, 'w', encoding='utf-8', newline='')
+
+    def close(self):
+        self._file.close()
+
+    def start_table(self, name, style_name):
+        self._rows = []
+
+    def write_row(self, template, values):
+        row = OrderedDict(row=template.kind)
+        for (field, value) in zip(template.fields, values):
+            if field in SYMBOL_FIELDS:
+                value = PLAIN_SYMBOLS.get(value, value)
+            row[field] = str(value)
+        self._rows.append(row)
+
+    def write_text(self, text, mark=None, links=False):
+        """Text outside of rows only adds vertical space"""
+
+    def end_table(self, label=None):
+        self.write_table(label, self._rows)
+        self._rows = []
+
+    def write_table(self, table_id, rows):
+        raise NotImplementedError
+
+class CsvRowDoc(PlainRowDoc):
+    """
+    Writes the rows of the family tables to a CSV file, one line per row
+    with the id of the table, the kind of row and its values.
+    """
+    def open(self, filename):
+        PlainRowDoc.open(self, filename)
+        self._writer = csv.DictWriter(
+            self._file, ('table', 'row') + ROW_FIELDS)
+        self._writer.writeheader()
+
+    def write_table(self, table_id, rows):
+        for row in rows:
+            row['table'] = table_id
+        self._writer.writerows(rows)
+
+class JsonRowDoc(PlainRowDoc):
+    """
+    Writes the family tables to a JSON file as a list of tables, each with
+    its id and its rows. Empty values are left out.
+    """
+    def open(self, filename):
+        PlainRowDoc.open(self, filename)
+        self._file.write("[")
+        self._separator = "\n"
+
+    def close(self):
+        self._file.write("\n]\n")
+        PlainRowDoc.close(self)
+
+    def write_table(self, table_id, rows):
+        table = OrderedDict(table=table_id)
+        table['rows'] = [
+            OrderedDict((field, value) for field, value in row.items()
+                        if value)
+            for row in rows]
+        self._file.write(self._separator)
+        self._file.write(json.dumps(table, ensure_ascii=False))
+        self._separator = ",\n"
+
+class TeeDoc:
+    """
+    Passes the family tables written by a ChronicleRenderer on to several
+    documents.
+    """
+    def __init__(self, docs):
+        self._docs = docs
+
+    def start_table(self, name, style_name):
+        for doc in self._docs:
+            doc.start_table(name, style_name)
+
+    def write_row(self, template, values):
+        for doc in self._docs:
+            doc.write_row(template, values)
+
+    def write_text(self, text, mark=None, links=False):
+        for doc in self._docs:
+            doc.write_text(text)
+
+    def end_table(self, label=None):
+        for doc in self._docs:
+            doc.end_table(label)
+
+# Report option, file extension and document of the plain row formats
+ROW_FORMATS = (
+    ('csv', ".csv", CsvRowDoc),
+    ('json', ".json", JsonRowDoc),
+)
@@ -0,0 +1,418 @@
+""" Benchmarks for the FamilyChronicles report on synthetic databases
+
+Run from the directory containing the plugin, e.g.
+
+    python -m FamilyChronicles.familychroniclesbenchmark --sizes 1000,10000
+
+For each size an in-memory database with a single descendant tree of about
+that many persons is generated and the report is run on it. One JSON object
+per size with the wall and CPU times of the report phases is written to
+standard output or appended to the file given with --output.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+from gramps.gen.const import VERSION as GRAMPS_VERSION
+from gramps.gen.db import DBBACKEND, DbTxn
+from gramps.gen.db.utils import make_database
+from gramps.gen.filters import reload_custom_filters
+from gramps.gen.lib import ChildRef, Date, Event, EventRef, EventType, Family
+from gramps.gen.lib import Name, Note, NoteType, Person, Place, PlaceName
+from gramps.gen.lib import PlaceRef, PlaceType, Surname
+from gramps.gen.plug.docgen import PaperSize, PaperStyle, PAPER_LANDSCAPE
+from gramps.gen.plug.docgen import StyleSheet
+from gramps.gen.plug.report._options import OptionHandler
+from gramps.gen.user import User
+from gramps.gen.utils.id import create_id
+
+from .familychronicles import FamilyChronicles, FamilyChroniclesOptions
+from .familychronicles import SimpleLaTeXDoc, FALSE_VALUES
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+# Number of persons added to the database per transaction
+BATCH_SIZE = 1000
+PLACE_TYPES = (PlaceType.COUNTRY, PlaceType.STATE, PlaceType.COUNTY,
+               PlaceType.CITY, PlaceType.VILLAGE)
+FIRST_NAMES = {
+    Person.MALE: ("Hans", "Jakob", "Ulrich", "Christian", "Johann", "Peter"),
+    Person.FEMALE: ("Anna", "Maria", "Elisabeth", "Barbara", "Verena"),
+}
+SURNAMES = ("Bütikofer", "Schneider", "Müller", "Zaugg", "Gerber", "Iseli")
+EXTRA_EVENT_TYPES = (EventType.BAPTISM, EventType.BURIAL, EventType.CENSUS,
+                     EventType.OCCUPATION, EventType.RESIDENCE)
+
+class DatabaseGenerator:
+    """
+    Generates a synthetic descendant tree of one center person.
+
+    Descendants are added generation by generation. Every descendant gets a
+    spouse and with the given rate a second one. As the chronicle follows
+    the families of fathers, only the families of sons have children, about
+    fanout each. Spouses come without ancestors.
+    """
+    def __init__(self, persons, generations=None, fanout=3,
+                 remarriage_rate=0.1, events_per_person=3, note_rate=0.2,
+                 place_depth=4, seed=1):
+        self.persons = persons
+        self.generations = generations
+        self.fanout = fanout
+        self.remarriage_rate = remarriage_rate
+        self.events_per_person = events_per_person
+        self.note_rate = note_rate
+        self.place_depth = place_depth
+        self._random = random.Random(seed)
+        self._counts = {'person': 0, 'family': 0, 'event': 0, 'note': 0,
+                        'place': 0}
+        self._places = []
+        self._db = None
+        self._trans = None
+
+    def generate(self, directory=None):
+        """
+        Return a new database, in memory or in the given directory, and the
+        id of the center person
+        """
+        self._db = make_database("sqlite")
+        if directory:
+            # names the backend as in the directory of a family tree
+            with open(os.path.join(directory, DBBACKEND), 'w') as dbid_file:
+                dbid_file.write("sqlite")
+        self._db.load(directory or ":memory:")
+        self.__begin_transaction()
+        self.__add_places()
+        root = self.__new_person(Person.MALE, 1600, None)
+        queue = [(root, 1600, 1)]
+        queue_idx = 0
+        while queue_idx < len(queue):
+            (person, year, generation) = queue[queue_idx]
+            queue_idx += 1
+            if self._counts['person'] + len(queue) - queue_idx < \
+                self.persons and \
+                (self.generations is None or generation < self.generations):
+                for child in self.__add_families(person, year):
+                    queue.append((child, year + 25, generation + 1))
+            self.__add_person(person)
+            if self._counts['person'] % BATCH_SIZE == 0:
+                self._db.transaction_commit(self._trans)
+                self.__begin_transaction()
+        self._db.transaction_commit(self._trans)
+        return (self._db, root.gramps_id)
+
+    def get_counts(self):
+        """Return the number of generated objects per type"""
+        return dict(self._counts)
+
+    def __begin_transaction(self):
+        self._trans = DbTxn("Synthetic database", self._db, batch=True)
+        self._db.transaction_begin(self._trans)
+
+    def __add_places(self):
+        parents = [None]
+        for depth in range(self.place_depth):
+            place_type = PLACE_TYPES[min(depth, len(PLACE_TYPES) - 1)]
+            level = []
+            for parent in parents:
+                for idx in range(3 if depth else 1):
+                    place = Place()
+                    place.set_name(PlaceName(value="Ort {}-{}".format(
+                        depth, len(level) + idx)))
+                    place.set_type(place_type)
+                    if parent is not None:
+                        placeref = PlaceRef()
+                        placeref.ref = parent.handle
+                        place.add_placeref(placeref)
+                    self.__add_object(place, 'place', self._db.add_place)
+                    level.append(place)
+            parents = level
+        self._places = parents
+
+    def __new_person(self, gender, year, parent_family):
+        """Return a new person with events, not yet added to the database"""
+        person = Person()
+        person.set_handle(create_id())
+        person.set_gender(gender)
+        name = Name()
+        name.set_first_name(self._random.choice(FIRST_NAMES[gender]))
+        surname = Surname()
+        surname.set_surname(self._random.choice(SURNAMES))
+        name.add_surname(surname)
+        person.set_primary_name(name)
+        if parent_family is not None:
+            person.add_parent_family_handle(parent_family.handle)
+
+        self.__add_event(person, EventType.BIRTH, year)
+        if self.events_per_person > 1:
+            self.__add_event(person, EventType.DEATH,
+                             year + self._random.randint(1, 90))
+        for _ in range(self.events_per_person - 2):
+            self.__add_event(person, self._random.choice(EXTRA_EVENT_TYPES),
+                             year + self._random.randint(0, 60),
+                             self._random.choice(("Landwirt", "Lehrer")))
+        if self._random.random() < self.note_rate:
+            note = Note("Synthetic note of a person")
+            note.set_type(NoteType.PERSON)
+            self.__add_object(note, 'note', self._db.add_note)
+            person.add_note(note.handle)
+        return person
+
+    def __add_families(self, person, year):
+        """
+        Add the families of a descendant and return its children, which are
+        added to the database once their own families are known.
+        """
+        children = []
+        marriages = 2 if self._random.random() < self.remarriage_rate else 1
+        for _ in range(marriages):
+            family = Family()
+            family.set_handle(create_id())
+            if person.get_gender() == Person.MALE:
+                spouse = self.__new_person(Person.FEMALE, year + 2, None)
+                family.set_father_handle(person.handle)
+                family.set_mother_handle(spouse.handle)
+            else:
+                spouse = self.__new_person(Person.MALE, year - 2, None)
+                family.set_father_handle(spouse.handle)
+                family.set_mother_handle(person.handle)
+            self.__add_event(family, EventType.MARRIAGE, year + 24)
+            if person.get_gender() == Person.MALE:
+                number_of_children = self._random.randint(
+                    max(0, self.fanout - 1), self.fanout + 1)
+            else:
+                number_of_children = 0
+            for child_idx in range(number_of_children):
+                child = self.__new_person(
+                    self._random.choice((Person.MALE, Person.FEMALE)),
+                    year + 26 + 2 * child_idx, family)
+                child_ref = ChildRef()
+                child_ref.ref = child.handle
+                family.add_child_ref(child_ref)
+                children.append(child)
+            person.add_family_handle(family.handle)
+            spouse.add_family_handle(family.handle)
+            self.__add_person(spouse)
+            self.__add_object(family, 'family', self._db.add_family)
+        return children
+
+    def __add_event(self, obj, event_type, year, description=""):
+        event = Event()
+        event.set_type(event_type)
+        date = Date()
+        if self._random.random() < 0.7:
+            date.set_yr_mon_day(year, self._random.randint(1, 12),
+                                self._random.randint(1, 28))
+        elif self._random.random() < 0.8:
+            date.set_yr_mon_day(year, 0, 0)
+        event.set_date_object(date)
+        if self._places and self._random.random() < 0.8:
+            event.set_place_handle(self._random.choice(self._places).handle)
+        event.set_description(description)
+        self.__add_object(event, 'event', self._db.add_event)
+        event_ref = EventRef()
+        event_ref.ref = event.handle
+        obj.add_event_ref(event_ref)
+
+    def __add_person(self, person):
+        self.__add_object(person, 'person', self._db.add_person)
+
+    def __add_object(self, obj, obj_type, add):
+        if not obj.handle:
+            obj.set_handle(create_id())
+        self._counts[obj_type] += 1
+        obj.set_gramps_id("{}{:07d}".format(
+            obj_type[0].upper(), self._counts[obj_type]))
+        add(obj, self._trans, set_gid=False)
+
+class TimedLaTeXDoc(SimpleLaTeXDoc):
+    """
+    SimpleLaTeXDoc summing up the wall time spent in the document layer.
+    """
+    def __init__(self, styles, paper_style, track, uistate=None):
+        SimpleLaTeXDoc.__init__(self, styles, paper_style, track, uistate)
+        self.seconds = 0.0
+
+    def write_text(self, text, mark=None, links=False):
+        start = time.perf_counter()
+        SimpleLaTeXDoc.write_text(self, text, mark, links)
+        self.seconds += time.perf_counter() - start
+
+    def start_table(self, name, style_name):
+        start = time.perf_counter()
+        SimpleLaTeXDoc.start_table(self, name, style_name)
+        self.seconds += time.perf_counter() - start
+
+    def end_table(self, label=None):
+        start = time.perf_counter()
+        SimpleLaTeXDoc.end_table(self, label)
+        self.seconds += time.perf_counter() - start
+
+    def write_row(self, template, values):
+        start = time.perf_counter()
+        SimpleLaTeXDoc.write_row(self, template, values)
+        self.seconds += time.perf_counter() - start
+
+    def write_fragment(self, fragment):
+        start = time.perf_counter()
+        SimpleLaTeXDoc.write_fragment(self, fragment)
+        self.seconds += time.perf_counter() - start
+
+    def close(self):
+        start = time.perf_counter()
+        SimpleLaTeXDoc.close(self)
+        self.seconds += time.perf_counter() - start
+
+def _timed(function):
+    """Call function and return its wall and CPU time in seconds"""
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    function()
+    return {'wall': time.perf_counter() - wall,
+            'cpu': time.process_time() - cpu}
+
+def get_default_options(database):
+    """
+    Return report options with the default values rather than the ones
+    saved by the report dialog. The option handler only holds document and
+    output.
+    """
+    options = FamilyChroniclesOptions("Family Chronicles", database)
+    options.handler = OptionHandler(options.name, options.options_dict)
+    return options
+
+def get_option_values(database, values):
+    """
+    Return the option values given as text on the command line converted to
+    the type of the default values. Boolean options are false for the
+    values switching timing off, e.g. "False" or "0".
+    """
+    menu = get_default_options(database).menu
+    option_values = {}
+    for (name, value) in values.items():
+        default = menu.get_option_by_name(name).get_value()
+        if isinstance(default, bool):
+            option_values[name] = value.strip().lower() not in FALSE_VALUES
+        elif isinstance(default, int):
+            option_values[name] = int(value)
+        elif isinstance(default, float):
+            option_values[name] = float(value)
+        else:
+            option_values[name] = value
+    return option_values
+
+def run_report(database, person_id, output, **option_values):
+    """
+    Run the report on a database and return the times of its phases. The
+    document layer is timed within write_report and end_report. Options
+    not given keep their default values.
+    """
+    options = get_default_options(database)
+    options.menu.get_option_by_name('pid').set_value(person_id)
+    for name, value in option_values.items():
+        options.menu.get_option_by_name(name).set_value(value)
+    styles = StyleSheet()
+    options.make_default_style(styles)
+    paper_layout = PaperStyle(PaperSize("a4", None, None), PAPER_LANDSCAPE)
+    options.set_document(SimpleLaTeXDoc(styles, paper_layout, []))
+    # The report opens its document itself if an output is set, so the
+    # timed document is opened here instead
+    options.set_output(None)
+
+    report = FamilyChronicles(database, options, User())
+    timed_doc = TimedLaTeXDoc(styles, paper_layout, [])
+    timed_doc.timer = report.doc.timer
+    timed_doc.tables_per_part = report.doc.tables_per_part
+    report.doc = timed_doc
+    report.doc.open(output)
+    report.standalone = True
+
+    times = {}
+    times['begin_report'] = _timed(report.begin_report)
+    times['write_report'] = _timed(report.write_report)
+    doc_seconds = report.doc.seconds
+    times['end_report'] = _timed(report.end_report)
+    times['doc'] = {'write_report': doc_seconds,
+                    'end_report': report.doc.seconds - doc_seconds}
+    times['tables'] = report.doc.get_table_count()
+    return times
+
+def run_benchmark(size, generator_options, values):
+    """Generate a database of the given size, run the report with the option
+    values given as text on it and return the result record"""
+    generator = DatabaseGenerator(size, **generator_options)
+    start = time.perf_counter()
+    (database, person_id) = generator.generate()
+    generate_seconds = time.perf_counter() - start
+    option_values = get_option_values(database, values)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        output = os.path.join(output_dir, "FamilyChronicles.tex")
+        times = run_report(database, person_id, output, **option_values)
+        output_bytes = os.path.getsize(output)
+    database.close()
+
+    result = {
+        'size': size,
+        'objects': generator.get_counts(),
+        'generator': generator_options,
+        'options': option_values,
+        'generate_seconds': generate_seconds,
+        'output_bytes': output_bytes,
+        'python': platform.python_version(),
+        'gramps': GRAMPS_VERSION,
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    result.update(times)
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the FamilyChronicles report")
+    parser.add_argument(
+        '--sizes', default=",".join(str(size) for size in DEFAULT_SIZES),
+        help="comma separated numbers of persons")
+    parser.add_argument('--generations', type=int, default=None)
+    parser.add_argument('--fanout', type=int, default=3)
+    parser.add_argument('--remarriage-rate', type=float, default=0.1)
+    parser.add_argument('--events-per-person', type=int, default=3)
+    parser.add_argument('--note-rate', type=float, default=0.2)
+    parser.add_argument('--place-depth', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument(
+        '--option', action='append', default=[], metavar='NAME=VALUE',
+        help="report option, e.g. workers=4; may be repeated")
+    parser.add_argument('--label', default="",
+                        help="label stored with the results, e.g. a version")
+    parser.add_argument('--output', help="file the results are appended to")
+    args = parser.parse_args(argv)
+    # as done by the Gramps CLI; needed for the center person filter option
+    reload_custom_filters()
+
+    generator_options = {
+        'generations': args.generations,
+        'fanout': args.fanout,
+        'remarriage_rate': args.remarriage_rate,
+        'events_per_person': args.events_per_person,
+        'note_rate': args.note_rate,
+        'place_depth': args.place_depth,
+        'seed': args.seed,
+    }
+    values = dict(option.split("=", 1) for option in args.option)
+
+    output = open(args.output, 'a') if args.output else sys.stdout
+    try:
+        for size in args.sizes.split(","):
+            result = run_benchmark(int(size), generator_options, values)
+            result['label'] = args.label
+            output.write(json.dumps(result, sort_keys=True) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+if __name__ == "__main__":
+    main()
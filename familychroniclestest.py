@@ -1,8 +1,18 @@
 """ Unittest methods for FamilyChronicles report """
+import csv
+import json
+import os
+import re
+import tempfile
 import unittest
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
-from gramps.gen.db.utils import import_as_dict
+from gramps.gen.config import config
+from gramps.gen.db import DbTxn
+from gramps.gen.db.utils import import_as_dict, make_database
+from gramps.gen.lib import ChildRef, Date, Event, EventRef, EventType, Family
+from gramps.gen.lib import Name, Person, Surname
+from gramps.gen.filters import reload_custom_filters
 from gramps.gen.plug import BasePluginManager
 from gramps.gen.plug.docgen import PaperSize, PaperStyle, PAPER_LANDSCAPE
 from gramps.gen.plug.docgen import StyleSheet
@@ -11,7 +21,12 @@ from gramps.gen.dbstate import DbState
 from gramps.gui.plug.report._textreportdialog import TextReportDialog
 from gramps.gui.pluginmanager import GuiPluginManager
 
+from . import familychronicles
 from .familychronicles import FamilyChronicles, FamilyChroniclesOptions
+from .familychronicles import CachedDatabase, ExternalSorter, _patch_order
+from .familychronicles import IdSet, ChronicleSnapshot, render_snapshot
+from .familychronicles import EventDateTable, LineageIndex, SimpleLaTeXDoc
+from .familychroniclesbenchmark import DatabaseGenerator, get_default_options
 
 PLUGMAN = BasePluginManager.get_instance()
 # TEST_INPUT = '/Users/tommy/Documents/Familie/Adliken/Adliken.gramps'
@@ -20,6 +35,63 @@ TEST_OUTPUT = '/Users/tommy/Documents/Familie/gramps/FamilyChroniclesTest.tex'
 TEST_PERSON_ID = 'I1907'
 USER_PLUGIN_DIR = '/Users/tommy/Library/Application Support/gramps/gramps51/plugins'
 
+def read_included(filename):
+    """
+    Return the text of a LaTeX file with the files it includes inserted.
+    """
+    directory = os.path.dirname(filename)
+    with open(filename, encoding='utf-8') as tex_file:
+        text = tex_file.read()
+    return re.sub(
+        r"\\include\{([^}]*)\}\n",
+        lambda match: read_included(
+            os.path.join(directory, match.group(1) + ".tex")),
+        text)
+
+def build_database(persons, families):
+    """
+    Return an in-memory database with the given persons, a dictionary of
+    gramps ids to genders, and families, tuples of the gramps ids of
+    father, mother and children with None for a missing parent.
+    """
+    database = make_database("sqlite")
+    database.load(":memory:")
+    with DbTxn("Test tree", database) as trans:
+        person_objects = {}
+        for gramps_id, gender in persons.items():
+            person = Person()
+            person.set_gramps_id(gramps_id)
+            person.set_gender(gender)
+            name = Name()
+            name.set_first_name(gramps_id)
+            surname = Surname()
+            surname.set_surname("Test")
+            name.add_surname(surname)
+            person.set_primary_name(name)
+            database.add_person(person, trans)
+            person_objects[gramps_id] = person
+        for (family_idx, (father_id, mother_id, child_ids)) in \
+            enumerate(families):
+            family = Family()
+            family.set_gramps_id("F{:04d}".format(family_idx))
+            database.add_family(family, trans)
+            for (parent_id, set_parent) in (
+                    (father_id, family.set_father_handle),
+                    (mother_id, family.set_mother_handle)):
+                if parent_id:
+                    set_parent(person_objects[parent_id].handle)
+                    person_objects[parent_id].add_family_handle(family.handle)
+            for child_id in child_ids:
+                child_ref = ChildRef()
+                child_ref.ref = person_objects[child_id].handle
+                family.add_child_ref(child_ref)
+                person_objects[child_id].add_parent_family_handle(
+                    family.handle)
+            database.commit_family(family, trans)
+        for person in person_objects.values():
+            database.commit_person(person, trans)
+    return database
+
 class Familychroniclestest(unittest.TestCase):
 #class Test_Familychroniclesmethods(unittest.TestCase):
     """ Unittest methods for FamilyChronicles report """
@@ -27,6 +99,7 @@ class Familychroniclestest(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         """ Import test data as in-memory database """
+        reload_custom_filters()
         cls.db = import_as_dict(TEST_INPUT, User())
 
     @classmethod
@@ -105,36 +178,579 @@ class Familychroniclestest(unittest.TestCase):
         assert module is not None
 
     def test_get_families(self):
+        """
+        Persons of a surname grouped by the top family of their lineage.
+        """
+        lineages = LineageIndex(self.db)
         families = {}
         i = 0
-        for person_ref in self.db.get_person_handles():
-            person = self.db.get_person_from_handle(person_ref)
-            name = person.get_primary_name()
-            first_name = name.first_name
-            surname = name.get_surname()
+        for person in self.db.iter_people():
+            surname = person.get_primary_name().get_surname()
             if surname == 'Bütikofer':
-                family_id = self._get_top_family(person, None)
-                if family_id not in families:
-                    families[family_id] = 1
-                else:
-                    families[family_id] = families[family_id] + 1
+                family_id = lineages.get_top_family(person.handle)
+                families[family_id] = families.get(family_id, 0) + 1
                 i = i + 1
         print(i)
         print(families)
+        for family_id, size in lineages.get_sizes().items():
+            self.assertEqual(len(lineages.get_members(family_id)), size)
+            self.assertGreaterEqual(size, families.get(family_id, 0))
+
+class OrderTest(unittest.TestCase):
+    """ Unittest methods for ordering without a database """
+
+    def test_patch_order(self):
+        """
+        Patching the previous order gives the order of a full sort.
+        """
+        previous = (['I1', 'I2', 'I3'], [30, 10, 20], ['I2', 'I3', 'I1'])
+        person_ids = ['I1', 'I4', 'I2', 'I3']
+        keys = [30, 20, 25, 20]
+        self.assertEqual(_patch_order(previous, person_ids, keys), [1, 3, 2, 0])
+
+    def test_external_sorter(self):
+        """
+        Records spilled in several runs are merged in sorted order.
+        """
+        records = [(key % 7, idx, "I{}".format(idx))
+                   for idx, key in enumerate(range(100, 0, -3))]
+        sorter = ExternalSorter(4)
+        for record in records:
+            sorter.add(record)
+        self.assertEqual(list(sorter), sorted(records))
+        self.assertEqual(len(sorter), len(records))
+        sorter.close()
+
+class GeneratedDatabaseTest(unittest.TestCase):
+    """ Report runs on a generated database """
+
+    @classmethod
+    def setUpClass(cls):
+        """ Generate a small in-memory database """
+        reload_custom_filters()
+        (cls.db, cls.person_id) = DatabaseGenerator(300, seed=1).generate()
+
+    @classmethod
+    def tearDownClass(cls):
+        """ Close database """
+        cls.db.close()
+
+    def run_report(self, output, database=None, **option_values):
+        """
+        Run the report on the generated or the given database with the
+        default options and the given option values and return it.
+        """
+        database = database or self.db
+        options = get_default_options(database)
+        options.menu.get_option_by_name('pid').set_value(self.person_id)
+        for name, value in option_values.items():
+            options.menu.get_option_by_name(name).set_value(value)
+        styles = StyleSheet()
+        options.make_default_style(styles)
+        paper_layout = PaperStyle(PaperSize("a4", None, None), PAPER_LANDSCAPE)
+        options.set_document(SimpleLaTeXDoc(styles, paper_layout, []))
+        options.set_output(output)
+
+        my_report = FamilyChronicles(database, options, User())
+        my_report.begin_report()
+        my_report.write_report()
+        my_report.end_report()
+        return my_report
+
+    def get_other_father_id(self):
+        """Return the id of a father of children other than the center"""
+        for family in self.db.iter_families():
+            father = self.db.get_person_from_handle(family.get_father_handle())
+            if father.gramps_id != self.person_id and \
+                family.get_child_ref_list():
+                return father.gramps_id
+        return None
+
+    def test_fetch_budget(self):
+        """
+        Every object is fetched from the database at most once per run.
+        """
+        with tempfile.TemporaryDirectory() as output_dir:
+            my_report = self.run_report(
+                os.path.join(output_dir, "budget.tex"), count_fetches=True,
+                cache_size=0)
+        counter = my_report.fetch_counter
+        for obj_type in ('person', 'family', 'event', 'place', 'note'):
+            self.assertGreater(counter.get_counts().get(obj_type, 0), 0)
+            self.assertEqual(counter.get_max_fetches(obj_type), 1)
+        self.assertEqual(counter.get_repeated_fetches(), 0)
+
+    def test_cached_database(self):
+        """
+        Repeated lookups are served from the handle cache.
+        """
+        cached_db = CachedDatabase(self.db, 10)
+        person = cached_db.get_person_from_gramps_id(self.person_id)
+        self.assertIs(person, cached_db.get_person_from_gramps_id(self.person_id))
+        stats = cached_db.get_statistics()
+        self.assertEqual(stats['get_person_from_gramps_id'], (1, 1))
+
+    def test_fragment_cache(self):
+        """
+        A second run with the fragment cache writes the same chronicle
+        without rendering any table, also after a run for another center
+        person with the same cache.
+        """
+        with tempfile.TemporaryDirectory() as cache_dir:
+            output = os.path.join(cache_dir, "run0.tex")
+            first = self.run_report(output, fragment_cache=cache_dir)
+            with open(output) as output_file:
+                first_output = output_file.read()
+            self.run_report(os.path.join(cache_dir, "other.tex"),
+                            fragment_cache=cache_dir,
+                            pid=first._person_id_list[-1])
+            output = os.path.join(cache_dir, "run1.tex")
+            with self.assertLogs(".Chronicles", level='INFO') as logs:
+                self.run_report(output, fragment_cache=cache_dir)
+            with open(output) as output_file:
+                self.assertEqual(output_file.read(), first_output)
+        self.assertIn("INFO:.Chronicles:0 of {} family tables rendered".format(
+            len(first._person_id_list)), logs.output)
+
+    def test_row_formats(self):
+        """
+        The CSV and JSON files hold the same family tables as the LaTeX file
+        with plain values.
+        """
+        with tempfile.TemporaryDirectory() as output_dir:
+            self.run_report(os.path.join(output_dir, "rows.tex"), csv=True,
+                            json=True)
+            with open(os.path.join(output_dir, "rows.tex")) as tex_file:
+                tables = tex_file.read().count(r"\begin{table}")
+            self.assertGreater(tables, 0)
+            with open(os.path.join(output_dir, "rows.json")) as json_file:
+                json_tables = json.load(json_file)
+            self.assertEqual(len(json_tables), tables)
+            # plain values: no LaTeX, references are the ids of tables
+            rows = [row for table in json_tables for row in table['rows']]
+            self.assertFalse(
+                [value for row in rows for value in row.values()
+                 if "\\" in value])
+            references = set(
+                row['reference'] for row in rows if 'reference' in row)
+            self.assertTrue(references)
+            self.assertLessEqual(
+                references, set(table['table'] for table in json_tables))
+            self.assertIn("*", set(row.get('birth_symbol') for row in rows))
+            with open(os.path.join(output_dir, "rows.csv")) as csv_file:
+                self.assertEqual(
+                    len(set(row['table'] for row in csv.DictReader(csv_file))),
+                    tables)
+
+    def test_maternal_lines(self):
+        """
+        Following maternal lines writes every family once, headed by the
+        followed parent, also with a cousin marriage, a family without
+        father and a person that is its own ancestor.
+        """
+        female = Person.FEMALE
+        database = build_database(
+            {'R': Person.MALE, 'W': female, 'A': Person.MALE, 'B': female,
+             'X': female, 'Y': Person.MALE, 'C': Person.MALE, 'D': female,
+             'E': Person.MALE, 'G': Person.MALE, 'K': Person.MALE},
+            [('R', 'W', ['A', 'B']), ('A', 'X', ['C', 'D', 'R']),
+             ('Y', 'B', ['E']), ('E', 'D', ['G']), (None, 'D', ['K'])])
+        options = get_default_options(database)
+        options.menu.get_option_by_name('pid').set_value('R')
+        options.menu.get_option_by_name('maternal_lines').set_value(True)
+        styles = StyleSheet()
+        options.make_default_style(styles)
+        paper_layout = PaperStyle(PaperSize("a4", None, None), PAPER_LANDSCAPE)
+        options.set_document(SimpleLaTeXDoc(styles, paper_layout, []))
+        with tempfile.TemporaryDirectory() as output_dir:
+            output = os.path.join(output_dir, "maternal.tex")
+            options.set_output(output)
+            with self.assertLogs(".Chronicles", level='WARNING') as logs:
+                my_report = FamilyChronicles(database, options, User())
+                my_report.begin_report()
+                my_report.write_report()
+                my_report.end_report()
+            with open(output) as output_file:
+                tables = re.findall(r"\\begin\{table\}.*?\\end\{table\}",
+                                    output_file.read(), re.DOTALL)
+        database.close()
+        self.assertTrue(any("Cycle in the family tree" in message
+                            for message in logs.output))
+        heads = [re.search(r"\\textbf\{(\w) Test\}", table).group(1)
+                 for table in tables]
+        self.assertEqual(sorted(heads), ['A', 'B', 'D', 'E', 'R'])
+        # every child is written in the table of one family only
+        children = [child for table in tables
+                    for child in re.findall(r"^(\w)&", table, re.MULTILINE)]
+        self.assertEqual(
+            sorted(children), ['A', 'B', 'C', 'D', 'E', 'G', 'K', 'R'])
+        d_table = tables[heads.index('D')]
+        self.assertIn("Tochter von A Test und X Test", d_table)
+        self.assertNotIn("G", re.findall(r"^(\w)&", d_table, re.MULTILINE))
+
+    def test_vocation_order(self):
+        """
+        The vocations of a parent without notes are shown in event order.
+        """
+        database = build_database(
+            {'A': Person.MALE, 'B': Person.FEMALE, 'C': Person.MALE},
+            [('A', 'B', ['C'])])
+        with DbTxn("Vocations", database) as trans:
+            person = database.get_person_from_gramps_id('A')
+            for description in ("Zimmermann", "Bauer", "Zimmermann",
+                                "Gemeinderat"):
+                event = Event()
+                event.set_type(EventType.OCCUPATION)
+                event.set_description(description)
+                database.add_event(event, trans)
+                event_ref = EventRef()
+                event_ref.ref = event.handle
+                person.add_event_ref(event_ref)
+            database.commit_person(person, trans)
+        with tempfile.TemporaryDirectory() as output_dir:
+            output = os.path.join(output_dir, "vocations.tex")
+            self.run_report(output, database=database, pid='A')
+            with open(output, encoding='utf-8') as tex_file:
+                self.assertIn("Zimmermann, Bauer, Gemeinderat", tex_file.read())
+        database.close()
+
+    def test_output_modes(self):
+        """
+        Serial, parallel, pipelined and streaming runs write the same
+        chronicle.
+        """
+        modes = [{}, {'workers': 2}, {'pipeline': True},
+                 {'memory_limit': 1}]
+        with tempfile.TemporaryDirectory() as output_dir:
+            outputs = []
+            for (mode_idx, option_values) in enumerate(modes):
+                output = os.path.join(output_dir, "mode{}.tex".format(mode_idx))
+                self.run_report(output, **option_values)
+                with open(output) as output_file:
+                    outputs.append(output_file.read())
+        for output in outputs[1:]:
+            self.assertEqual(output, outputs[0])
+
+    def test_filter(self):
+        """
+        The first filter entry only selects the center person, the others
+        add a chronicle per matching person.
+        """
+        with tempfile.TemporaryDirectory() as output_dir:
+            output = os.path.join(output_dir, "filter.tex")
+            single = self.run_report(output, filter=0)
+            descendants = self.run_report(output, filter=1)
+        self.assertEqual(len(single._chronicles), 1)
+        self.assertGreater(len(descendants._chronicles), 1)
 
-    def _get_top_family(self, person, family_id):
-        parent_family_id = family_id
-        family_handle = person.get_main_parents_family_handle()
-        if family_handle:
-            family = self.db.get_family_from_handle(family_handle)
-            parent_family_id = family.gramps_id
-            father_handle = family.get_father_handle()
-            mother_handle = family.get_mother_handle()
-            parent_handle = father_handle if father_handle else mother_handle
-            if parent_handle:
-                parent = self.db.get_person_from_handle(parent_handle)
-                name = person.get_primary_name()
-                first_name = name.first_name
-                surname = name.get_surname()
-                parent_family_id = self._get_top_family(parent, parent_family_id)
-        return parent_family_id
+    def test_timing_variable(self):
+        """
+        The timing variable switches timing on unless set to a false value,
+        and the tables are only timed with timing on.
+        """
+        with tempfile.TemporaryDirectory() as output_dir:
+            output = os.path.join(output_dir, "timing.tex")
+            for (value, timing) in (("0", False), ("off", False),
+                                    ("1", True)):
+                with patch.dict(os.environ,
+                                {'FAMILY_CHRONICLES_TIMING': value}):
+                    my_report = self.run_report(output, memory_limit=1)
+                self.assertEqual(my_report._timing, timing)
+            # without timing, tables are not timed when counting fetches
+            with patch.dict(os.environ, {'FAMILY_CHRONICLES_TIMING': "0"}):
+                counted = self.run_report(output, count_fetches=True)
+                pipelined = self.run_report(output, pipeline=True)
+            for my_report in (counted, pipelined):
+                self.assertFalse(
+                    {'render', 'pipeline'} & set(my_report._timer._wall))
+
+    def test_id_set(self):
+        """
+        Ids added to the set file are found, others are not.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            id_set = IdSet(os.path.join(directory, "ids.sqlite"))
+            id_set.add('I1')
+            id_set.add('I1')
+            self.assertIn('I1', id_set)
+            self.assertNotIn('I2', id_set)
+            id_set.close()
+
+    def test_lineage_heads(self):
+        """
+        Lineages headed by a mother are only included with maternal lines.
+        """
+        database = build_database(
+            {'F': Person.MALE, 'M': Person.FEMALE, 'A': Person.MALE,
+             'B': Person.MALE},
+            [('F', None, ['A']), (None, 'M', ['B'])])
+        lineages = LineageIndex(database)
+        self.assertEqual(
+            [database.get_person_from_handle(handle).gramps_id
+             for handle in lineages.get_heads()], ['F'])
+        self.assertEqual(
+            sorted(database.get_person_from_handle(handle).gramps_id
+                   for handle in lineages.get_heads(maternal_lines=True)),
+            ['F', 'M'])
+        database.close()
+
+    def test_event_dates(self):
+        """
+        The date keys and texts are the same with and without NumPy, also
+        for invalid, text-only and modified dates, which do not raise.
+        """
+        database = build_database(
+            {'A': Person.MALE, 'B': Person.FEMALE, 'C': Person.MALE},
+            [('A', 'B', ['C'])])
+        before = Date()
+        before.set(Date.QUAL_NONE, Date.MOD_BEFORE, Date.CAL_GREGORIAN,
+                   (1, 2, 1800, False))
+        text_only = Date()
+        text_only.set_as_text("um die Jahrhundertwende")
+        dates = {'A': [(1850, 7, 0), (1850, 0, 0), (1849, 12, 31)],
+                 'B': [text_only], 'C': [(0, 5, 3), before],
+                 'F0000': [(2000, 2, 30)]}
+        with DbTxn("Dates", database) as trans:
+            for (gramps_id, date_list) in dates.items():
+                if gramps_id.startswith("F"):
+                    obj = database.get_family_from_gramps_id(gramps_id)
+                else:
+                    obj = database.get_person_from_gramps_id(gramps_id)
+                for date in date_list:
+                    if isinstance(date, tuple):
+                        (year, month, day) = date
+                        date = Date()
+                        date.set_yr_mon_day(year, month, day)
+                    event = Event()
+                    event.set_date_object(date)
+                    database.add_event(event, trans)
+                    event_ref = EventRef()
+                    event_ref.ref = event.handle
+                    obj.add_event_ref(event_ref)
+                if gramps_id.startswith("F"):
+                    database.commit_family(obj, trans)
+                else:
+                    database.commit_person(obj, trans)
+
+        objects = list(database.iter_people()) + list(database.iter_families())
+        results = []
+        for numpy in (None, familychronicles.numpy):
+            with patch.object(familychronicles, 'numpy', numpy):
+                dates = EventDateTable(database)
+                for obj in objects:
+                    dates.add_events(obj)
+                dates.compute()
+            results.append((
+                {obj.gramps_id: dates.get_key(obj.handle) for obj in objects},
+                {obj.gramps_id: [dates.get_text(event_ref.ref)
+                                 for event_ref in obj.get_event_ref_list()]
+                 for obj in objects}))
+        database.close()
+
+        (keys, texts) = results[0]
+        self.assertEqual(texts, {'A': ["7.1850", "1850", "31.12.1849"],
+                                 'B': [""], 'C': ["3.5.0", ""],
+                                 'F0000': ["30.2.2000"]})
+        self.assertIsNone(keys['B'])
+        self.assertEqual(keys['C'], before.get_sort_value())
+        self.assertLess(keys['A'], keys['F0000'])
+        if familychronicles.numpy is None:
+            self.skipTest("NumPy is not installed")
+        self.assertEqual(results[1], results[0])
+
+    def test_serial_reason(self):
+        """
+        Without database files, further chronicles are written one after
+        the other and the reason is logged.
+        """
+        other_id = self.get_other_father_id()
+        with tempfile.TemporaryDirectory() as output_dir:
+            with self.assertLogs(".Chronicles", level='INFO') as logs:
+                self.run_report(
+                    os.path.join(output_dir, "serial.tex"), workers=2,
+                    pids=other_id,
+                    snapshot=os.path.join(output_dir, "snapshot.sqlite"))
+        self.assertIn(
+            "INFO:.Chronicles:Chronicles written one after the other: "
+            "the database has no files the worker processes can read",
+            logs.output)
+
+    def test_snapshot_signature(self):
+        """
+        The snapshot of a database on disk is used by a second run and
+        taken again after the place format or the database changed.
+        """
+        place_auto = config.get('preferences.place-auto')
+        with tempfile.TemporaryDirectory() as directory:
+            database_dir = os.path.join(directory, "database")
+            os.mkdir(database_dir)
+            (database, person_id) = DatabaseGenerator(50, seed=2).generate(
+                database_dir)
+            options = {'pid': person_id,
+                       'snapshot': os.path.join(directory, "snapshot.sqlite")}
+            output = os.path.join(directory, "snapshot.tex")
+            message = "INFO:.Chronicles:Chronicles read from snapshot " + \
+                options['snapshot']
+            try:
+                runs = []
+                for change in (None, None, 'place format', None, 'database'):
+                    if change == 'place format':
+                        config.set('preferences.place-auto', not place_auto)
+                    elif change == 'database':
+                        with DbTxn("Change", database) as trans:
+                            person = database.get_person_from_gramps_id(
+                                person_id)
+                            person.set_gender(Person.UNKNOWN)
+                            database.commit_person(person, trans)
+                    with self.assertLogs(".Chronicles", level='INFO') as logs:
+                        self.run_report(output, database=database, **options)
+                    runs.append(message in logs.output)
+            finally:
+                config.set('preferences.place-auto', place_auto)
+                database.close()
+        self.assertEqual(runs, [False, True, False, True, False])
+
+    def test_load_chronicle(self):
+        """
+        The chronicles written from the records loaded for each of them are
+        the ones written from the whole snapshot.
+        """
+        with tempfile.TemporaryDirectory() as output_dir:
+            my_report = self.run_report(
+                os.path.join(output_dir, "report.tex"), filter=1)
+            self.assertGreater(len(my_report._chronicles), 2)
+            snapshot = ChronicleSnapshot(
+                os.path.join(output_dir, "snapshot.sqlite"))
+            snapshot.save("test", my_report._model, my_report._notes,
+                          my_report._chronicles)
+            (root_id, person_id_list, _) = my_report._chronicles[-1]
+            (model, _, loaded_ids) = snapshot.load_chronicle(root_id)
+            self.assertEqual(loaded_ids, person_id_list)
+            self.assertLess(len(model.persons), len(my_report._model.persons))
+
+            outputs = []
+            for workers in (1, 2):
+                directory = os.path.join(output_dir, str(workers))
+                os.mkdir(directory)
+                files = render_snapshot(
+                    snapshot.filename, os.path.join(directory, "c.tex"),
+                    workers=workers)
+                texts = {}
+                for filename in files:
+                    with open(filename, encoding='utf-8') as tex_file:
+                        texts[os.path.basename(filename)] = tex_file.read()
+                outputs.append(texts)
+        # chronicles without family tables are not stored
+        self.assertEqual(
+            len(outputs[0]),
+            len([chronicle for chronicle in my_report._chronicles
+                 if chronicle[1]]))
+        self.assertEqual(outputs[1], outputs[0])
+
+    def test_sharded_chronicles(self):
+        """
+        Further chronicles extracted and written by worker processes are
+        the ones written one after the other, with or without snapshot.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            database_dir = os.path.join(directory, "database")
+            os.mkdir(database_dir)
+            (database, person_id) = DatabaseGenerator(100, seed=3).generate(
+                database_dir)
+            other_ids = sorted(
+                person.gramps_id for person in database.iter_people()
+                if person.get_family_handle_list() and
+                person.gramps_id != person_id)[:3]
+            runs = ({'workers': 1}, {'workers': 2},
+                    {'workers': 2, 'csv': True},
+                    {'workers': 2, 'snapshot': os.path.join(
+                        directory, "snapshot.sqlite")})
+            outputs = []
+            try:
+                for (run_idx, option_values) in enumerate(runs):
+                    run_dir = os.path.join(directory, str(run_idx))
+                    os.mkdir(run_dir)
+                    my_report = self.run_report(
+                        os.path.join(run_dir, "c.tex"), database=database,
+                        pid=person_id, pids=" ".join(other_ids),
+                        **option_values)
+                    texts = {}
+                    for name in os.listdir(run_dir):
+                        if name.endswith(".tex"):
+                            with open(os.path.join(run_dir, name),
+                                      encoding='utf-8') as tex_file:
+                                texts[name] = tex_file.read()
+                    outputs.append(texts)
+                    if run_idx == 1:
+                        # only the first chronicle is extracted here
+                        self.assertEqual(len(my_report._chronicles), 1)
+                csv_names = sorted(name for name in os.listdir(
+                    os.path.join(directory, "2")) if name.endswith(".csv"))
+            finally:
+                database.close()
+        self.assertEqual(len(outputs[0]), 4)
+        for output in outputs[1:]:
+            self.assertEqual(output, outputs[0])
+        self.assertEqual(len(csv_names), 4)
+
+    def test_tables_per_part(self):
+        """
+        Parts of tables_per_part tables are included by the chronicle and
+        make up the chronicle written in one file. Unchanged parts are not
+        written again.
+        """
+        with tempfile.TemporaryDirectory() as output_dir:
+            whole = os.path.join(output_dir, "whole.tex")
+            my_report = self.run_report(whole)
+            tables = len(my_report._person_id_list)
+            output = os.path.join(output_dir, "parts.tex")
+            self.run_report(output, tables_per_part=5)
+            parts = sorted(name for name in os.listdir(output_dir)
+                           if name.startswith("parts-part"))
+            self.assertEqual(len(parts), (tables + 4) // 5)
+            with open(output, encoding='utf-8') as tex_file:
+                self.assertEqual(
+                    tex_file.read().count(r"\include{parts-part"),
+                    len(parts))
+            with open(whole, encoding='utf-8') as tex_file:
+                self.assertEqual(read_included(output), tex_file.read())
+
+            for name in parts:
+                os.utime(os.path.join(output_dir, name), (0, 0))
+            self.run_report(output, tables_per_part=5)
+            for name in parts:
+                self.assertEqual(
+                    os.path.getmtime(os.path.join(output_dir, name)), 0)
+
+    def test_render_snapshot_parts(self):
+        """
+        Chronicles rendered from a snapshot are split into the same parts
+        as the ones of the report.
+        """
+        other_id = self.get_other_father_id()
+        with tempfile.TemporaryDirectory() as output_dir:
+            for directory in ("report", "snapshot"):
+                os.mkdir(os.path.join(output_dir, directory))
+            output = os.path.join(output_dir, "report", "parts.tex")
+            my_report = self.run_report(output, tables_per_part=5,
+                                        pids=other_id)
+            snapshot = ChronicleSnapshot(
+                os.path.join(output_dir, "snapshot.sqlite"))
+            snapshot.save("test", my_report._model, my_report._notes,
+                          my_report._chronicles)
+            files = render_snapshot(
+                snapshot.filename,
+                os.path.join(output_dir, "snapshot", "parts.tex"),
+                workers=2, tables_per_part=5)
+            self.assertEqual(len(files), 2)
+            names = sorted(os.listdir(os.path.join(output_dir, "report")))
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(output_dir, "snapshot"))),
+                names)
+            for name in names:
+                with open(os.path.join(output_dir, "report", name)) as \
+                    report_file:
+                    expected = report_file.read()
+                with open(os.path.join(output_dir, "snapshot", name)) as \
+                    snapshot_file:
+                    self.assertEqual(snapshot_file.read(), expected)